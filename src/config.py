@@ -1,3 +1,4 @@
+import json
 import os
 
 from dotenv import load_dotenv
@@ -16,3 +17,42 @@ BUS_STOP_SITE_ID = int(os.environ.get("BUS_STOP_SITE_ID", "2216"))
 TRAIN_STOP_SITE_ID = int(os.environ.get("TRAIN_STOP_SITE_ID", "9633"))
 BUS_STOP_WALK_MINUTES = int(os.environ.get("BUS_STOP_WALK_MINUTES", "6"))
 TRAIN_STOP_WALK_MINUTES = int(os.environ.get("TRAIN_STOP_WALK_MINUTES", "10"))
+
+# Departures shown on the transport panel. Each rule names a stop, the walk
+# to it and the departures that count: by transport mode, line, and exact
+# `destination` or a part of it in `destination_contains`. A JSON list in
+# TRANSPORT_RULES replaces these.
+TRANSPORT_RULES = [
+    {
+        "site_id": BUS_STOP_SITE_ID,
+        "walk_minutes": BUS_STOP_WALK_MINUTES,
+        "transport_mode": "BUS",
+        "line": "605",
+        "destination": "Danderyds sjukhus",
+    },
+    {
+        "site_id": TRAIN_STOP_SITE_ID,
+        "walk_minutes": TRAIN_STOP_WALK_MINUTES,
+        "transport_mode": "TRAM",
+        "destination_contains": "Stockholms östra",
+    },
+]
+if os.environ.get("TRANSPORT_RULES"):
+    TRANSPORT_RULES = json.loads(os.environ["TRANSPORT_RULES"])
+
+# Departures are shown from the start hour until before the end hour, those
+# after the first one only when leaving within the horizon
+TRANSPORT_START_HOUR = int(os.environ.get("TRANSPORT_START_HOUR", "7"))
+TRANSPORT_END_HOUR = int(os.environ.get("TRANSPORT_END_HOUR", "11"))
+TRANSPORT_HORIZON_MINUTES = int(os.environ.get("TRANSPORT_HORIZON_MINUTES", "30"))
+
+# Tibber homes, by id or app nickname, shown on the price and the stats
+# panels; unset for the first home on the account
+TIBBER_PRICES_HOME = os.environ.get("TIBBER_PRICES_HOME") or None
+TIBBER_STATS_HOME = os.environ.get("TIBBER_STATS_HOME") or None
+
+# Length of the cheapest window marked on the price graph, 0 to hide it
+CHEAPEST_WINDOW_MINUTES = int(os.environ.get("CHEAPEST_WINDOW_MINUTES", "0"))
+
+# "json" keeps cache files readable, "binary" is smaller and faster to decode
+CACHE_FORMAT = os.environ.get("CACHE_FORMAT", "json")
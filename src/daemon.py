@@ -0,0 +1,37 @@
+import logging
+import signal
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Daemon:
+    """Runs refresh cycles on a fixed schedule until a stop signal arrives."""
+
+    def __init__(self, refresh, interval_seconds):
+        self.refresh = refresh
+        self.interval_seconds = interval_seconds
+        self._stop = threading.Event()
+
+    def stop(self, signum=None, frame=None):
+        if signum is not None:
+            logger.info("Received %s, shutting down", signal.Signals(signum).name)
+        self._stop.set()
+
+    def install_signal_handlers(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+    def run(self):
+        next_cycle = time.monotonic()
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Refresh cycle failed")
+
+            # Keep a steady cadence no matter how long the cycle took,
+            # but never run overdue cycles back to back
+            next_cycle = max(next_cycle + self.interval_seconds, time.monotonic())
+            self._stop.wait(next_cycle - time.monotonic())
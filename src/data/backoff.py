@@ -0,0 +1,63 @@
+import logging
+import time
+from datetime import timedelta
+
+from .cache import NotModified, peek, store
+
+logger = logging.getLogger(__name__)
+
+BASE_DELAY = timedelta(seconds=30)
+MAX_DELAY = timedelta(minutes=30)
+
+
+class UpstreamBackoff(RuntimeError):
+    """Raised instead of calling an upstream that failed moments ago."""
+
+
+def _state_key(upstream):
+    return f"backoff-{upstream}"
+
+
+def retry_delay(failures):
+    """Delay before the next attempt: 30 s doubling up to 30 minutes."""
+    delay = BASE_DELAY * (2 ** (failures - 1))
+    return min(delay, MAX_DELAY)
+
+
+def guarded(upstream, operation):
+    """Call `operation` unless `upstream` is still backing off after a failure.
+
+    Each failure in a row doubles the wait before the upstream is probed
+    again, so a broken service costs a cache lookup per cycle instead of a
+    full request timeout. The first success resets it.
+    """
+    state = peek(_state_key(upstream))
+    if state is not None and time.time() < state["retry_at"]:
+        raise UpstreamBackoff(
+            f"{upstream} failed {state['failures']} times, "
+            f"next attempt in {state['retry_at'] - time.time():.0f} s"
+        )
+
+    try:
+        result = operation()
+    except NotModified:
+        # The upstream answered, there was just nothing new
+        _recover(upstream, state)
+        raise
+    except Exception:
+        failures = (state or {}).get("failures", 0) + 1
+        delay = retry_delay(failures)
+        logger.warning("%s failed, backing off for %s", upstream, delay)
+        store(
+            _state_key(upstream),
+            {"failures": failures, "retry_at": time.time() + delay.total_seconds()},
+        )
+        raise
+
+    _recover(upstream, state)
+    return result
+
+
+def _recover(upstream, state):
+    if state is not None and state["failures"]:
+        store(_state_key(upstream), {"failures": 0, "retry_at": 0})
@@ -1,42 +1,362 @@
 import os
-import json
+import fcntl
 import logging
-from datetime import datetime
+import struct
+import threading
+import time
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any
+
+import metrics
+from config import CACHE_FORMAT
+
+from .serialisers import (  # noqa: F401 - re-exported for existing importers
+    SERIALISERS,
+    DateTimeEncoder,
+    datetime_decoder,
+    serialiser_for,
+)
 
 logger = logging.getLogger(__name__)
 
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "..", "cache")
+SCHEMA_VERSION = 1
+
+MAX_AGE = timedelta(days=3)
+MAX_BYTES = 5_000_000
+EVICTION_INTERVAL = timedelta(hours=1)
+EVICTION_MARKER = ".last-eviction"
+
+MEMORY_ENTRIES = 32
+
+# Decoded entries by cache file, most recently used last
+_memory = OrderedDict()
+_memory_lock = threading.Lock()
+
+# One lock per cache file, so only one thread at a time refreshes an entry
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+class NotModified(Exception):
+    """Raised by a revalidating refresh when the expired value still holds."""
+
+
+@dataclass(frozen=True)
+class Expired:
+    """Value of an expired entry, with the validators it was stored with."""
+
+    data: Any
+    validators: Any
+
+
+def _serialiser():
+    serialiser = SERIALISERS.get(CACHE_FORMAT)
+    if serialiser is None:
+        logger.warning("Unknown CACHE_FORMAT `%s`, using json", CACHE_FORMAT)
+        return SERIALISERS["json"]
+    return serialiser
+
+
+def next_slot(moment, interval):
+    """Start of the next `interval`-long slot, with slots aligned to midnight."""
+    midnight = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return midnight + ((moment - midnight) // interval + 1) * interval
+
+
+def _read_entry(cache_file):
+    with open(cache_file, "rb") as f:
+        raw = f.read()
+    content = serialiser_for(raw).loads(raw)
+
+    if isinstance(content, dict) and "__cache__" in content:
+        if content["__cache__"] != SCHEMA_VERSION:
+            return None
+        return content
+
+    # Files written before entries carried metadata never expire on their own
+    return {"__cache__": 0, "created": None, "ttl": None, "data": content}
+
+
+def _is_fresh(entry, now):
+    if entry["ttl"] is None:
+        return True
+    return now < entry["created"] + entry["ttl"]
+
+
+def _memory_get(cache_file):
+    with _memory_lock:
+        entry = _memory.get(cache_file)
+        if entry is not None:
+            _memory.move_to_end(cache_file)
+        return entry
+
+
+def _memory_put(cache_file, entry):
+    with _memory_lock:
+        _memory[cache_file] = entry
+        _memory.move_to_end(cache_file)
+        while len(_memory) > MEMORY_ENTRIES:
+            _memory.popitem(last=False)
+
+
+def clear_memory_cache():
+    with _memory_lock:
+        _memory.clear()
+
+
+def _new_entry(data, ttl, validators=None):
+    entry = {
+        "__cache__": SCHEMA_VERSION,
+        "created": time.time(),
+        "ttl": ttl.total_seconds() if ttl is not None else None,
+        "data": data,
+    }
+    if validators is not None:
+        entry["validators"] = validators
+    return entry
+
+
+def write_atomic(path, content):
+    """Replace the file at `path` with the bytes `content` in one rename.
+
+    Readers never see a partly written file: the content goes to a temporary
+    file first, so a crash or power cut leaves the old file in place."""
+    directory = os.path.dirname(path)
+    if not os.path.exists(directory):
+        os.makedirs(directory, exist_ok=True)
+    temp_file = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(temp_file, mode="wb") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_file, path)
+    except BaseException:
+        try:
+            os.remove(temp_file)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def _write_entry(cache_file, entry):
+    write_atomic(cache_file, _serialiser().dumps(entry))
+
+
+@contextmanager
+def _single_flight(cache_file):
+    """Hold the refresh of `cache_file` to one thread and one process.
+
+    Threads wait on an in-process lock, processes on an advisory lock of a
+    sidecar file. If the lock file cannot be used, the refresh goes ahead
+    without it."""
+    with _flights_lock:
+        thread_lock = _flights.setdefault(cache_file, threading.Lock())
+
+    with thread_lock, ExitStack() as stack:
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            lock_file = stack.enter_context(open(cache_file + ".lock", "a"))
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            # Keep the lock file young so eviction leaves it alone
+            os.utime(lock_file.fileno())
+        except OSError as e:
+            logger.debug("Cache lock unavailable for %s: %s", cache_file, e)
+        yield
+
+
+def _read_stored(cache_file, now=None):
+    # Entries written in the other format are still read, so switching
+    # CACHE_FORMAT does not throw the cache away. Without `now`, expired
+    # entries are returned too
+    base = os.path.splitext(cache_file)[0]
+    candidates = [cache_file] + [
+        base + serialiser.extension
+        for serialiser in SERIALISERS.values()
+        if base + serialiser.extension != cache_file
+    ]
+    for candidate in candidates:
+        try:
+            entry = _read_entry(candidate)
+        except (FileNotFoundError, EOFError, ValueError, struct.error):
+            continue
+        if entry is not None and (now is None or _is_fresh(entry, now)):
+            _memory_put(cache_file, entry)
+            return entry
+    return None
+
 
-class DateTimeEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, datetime):
-            return {"__datetime__": True, "as_str": obj.isoformat()}
-        return super().default(obj)
+def _cache_file(cache_key):
+    return os.path.join(CACHE_DIR, cache_key + _serialiser().extension)
 
 
-def datetime_decoder(dct):
-    if dct.get("__datetime__"):
-        return datetime.fromisoformat(dct["as_str"])
-    return dct
+def _lookup(cache_file, now):
+    entry = _memory_get(cache_file)
+    if entry is not None and _is_fresh(entry, now):
+        metrics.CACHE_REQUESTS.inc(result="hit", tier="memory")
+        return entry
 
+    entry = _read_stored(cache_file, now)
+    if entry is not None:
+        metrics.CACHE_REQUESTS.inc(result="hit", tier="disk")
+    return entry
 
-def cache(cache_key, operation):
-    cache_file = os.path.join(os.path.dirname(__file__), "..", "cache", cache_key + ".json")
+
+def _expired(cache_file):
+    entry = _memory_get(cache_file) or _read_stored(cache_file)
+    if entry is None:
+        return None
+    return Expired(entry["data"], entry.get("validators"))
+
+
+def _save(cache_file, data, ttl, validators=None):
+    entry = _new_entry(data, ttl, validators)
+    _memory_put(cache_file, entry)
     try:
-        with open(cache_file, "r") as f:
-            return json.load(f, object_hook=datetime_decoder)
-    except (FileNotFoundError, EOFError, json.JSONDecodeError):
-        data = operation()
+        _write_entry(cache_file, entry)
+    except Exception as exception:
+        logger.error("Failed to write to cache: %s", exception)
+
+
+def cache(cache_key, operation, ttl=None, keep_empty=False, revalidate=False):
+    """Return the cached value of `cache_key`, calling `operation` on a miss.
+
+    Entries written with a `ttl` (a timedelta) are treated as a miss once it
+    has passed; entries without one stay valid until evicted. `ttl` can also
+    be a function of the fresh value, for entries whose lifetime depends on
+    what they hold. Recently used entries are also kept decoded in memory, in
+    front of the files on disk.
+
+    Empty lists are not stored unless `keep_empty` is set, for operations
+    where nothing to show is a valid answer.
+
+    With `revalidate`, `operation` is called with the expired entry as an
+    `Expired`, or None when there is none, and returns the fresh value and
+    the validators to store with it as a pair. It can raise `NotModified`
+    instead, and the expired value is then stored again for another `ttl`.
+
+    When several threads or processes miss the same key at once, only one
+    of them calls `operation` and the others get the value it stored.
+    """
+    cache_file = _cache_file(cache_key)
+
+    entry = _lookup(cache_file, time.time())
+    if entry is not None:
+        return entry["data"]
+
+    with _single_flight(cache_file):
+        # Whoever held the lock before us may have just stored the entry
+        entry = _lookup(cache_file, time.time())
+        if entry is not None:
+            return entry["data"]
+
+        metrics.CACHE_REQUESTS.inc(result="miss")
+        validators = None
+        if revalidate:
+            expired = _expired(cache_file)
+            try:
+                data, validators = operation(expired)
+            except NotModified:
+                if expired is None:
+                    raise
+                data, validators = expired.data, expired.validators
+        else:
+            data = operation()
 
         # Skip saving empty arrays to disk
-        if data == []:
+        if data == [] and not keep_empty:
             return data
 
-        try:
-            cache_path = os.path.dirname(cache_file)
-            if not os.path.exists(cache_path):
-                os.makedirs(cache_path, exist_ok=True)
-            with open(cache_file, mode="w") as f:
-                json.dump(data, f, cls=DateTimeEncoder)
-        except Exception as exception:
-            logger.error("Failed to write to cache: %s", exception)
+        _save(cache_file, data, ttl(data) if callable(ttl) else ttl, validators)
         return data
+
+
+def peek(cache_key):
+    """Return the cached value of `cache_key`, or None when missing or expired."""
+    entry = _lookup(_cache_file(cache_key), time.time())
+    return entry["data"] if entry is not None else None
+
+
+def store(cache_key, data, ttl=None):
+    """Put `data` in the cache under `cache_key` without calling any operation."""
+    _save(_cache_file(cache_key), data, ttl)
+
+
+def evict(cache_dir=CACHE_DIR, max_age=MAX_AGE, max_bytes=MAX_BYTES, now=None):
+    """Delete cache files older than `max_age`, then the oldest ones until the
+    directory fits in `max_bytes`. Returns the number of files removed."""
+    now = now if now is not None else time.time()
+    try:
+        files = [
+            entry
+            for entry in os.scandir(cache_dir)
+            if entry.is_file() and entry.name != EVICTION_MARKER
+        ]
+    except FileNotFoundError:
+        return 0
+
+    files.sort(key=lambda entry: entry.stat().st_mtime)
+    total_bytes = sum(entry.stat().st_size for entry in files)
+    removed = 0
+    for entry in files:
+        stat = entry.stat()
+        too_old = now - stat.st_mtime > max_age.total_seconds()
+        if not too_old and total_bytes <= max_bytes:
+            break
+        try:
+            os.remove(entry.path)
+            removed += 1
+            total_bytes -= stat.st_size
+        except FileNotFoundError:
+            pass
+
+    if removed:
+        logger.info("Evicted %s cache files", removed)
+    return removed
+
+
+def _eviction_due(marker, interval):
+    try:
+        return time.time() - os.path.getmtime(marker) >= interval.total_seconds()
+    except FileNotFoundError:
+        return True
+
+
+def evict_if_due(cache_dir=CACHE_DIR, interval=EVICTION_INTERVAL):
+    """Run an eviction pass unless one finished less than `interval` ago.
+
+    The marker file is shared, so overlapping processes do not all scan the
+    directory. It is only touched once a pass is done, so a pass cut short
+    is retried by the next caller. Returns the number of files removed, or
+    None when no pass was due."""
+    marker = os.path.join(cache_dir, EVICTION_MARKER)
+    if not _eviction_due(marker, interval):
+        return None
+
+    removed = evict(cache_dir)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(marker, "w"):
+            pass
+    except OSError as e:
+        logger.error("Failed to mark cache eviction: %s", e)
+    return removed
+
+
+def evict_in_background(cache_dir=CACHE_DIR, interval=EVICTION_INTERVAL):
+    """Start `evict_if_due` in a daemon thread unless a pass ran recently.
+
+    Only for long-running processes: a daemon thread dies with the process,
+    so a one-shot run has to call `evict_if_due` itself."""
+    if not _eviction_due(os.path.join(cache_dir, EVICTION_MARKER), interval):
+        return None
+
+    thread = threading.Thread(
+        target=evict_if_due, args=(cache_dir, interval), daemon=True
+    )
+    thread.start()
+    return thread
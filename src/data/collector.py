@@ -0,0 +1,94 @@
+import logging
+import time
+from collections.abc import Callable
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any
+
+import metrics
+import timing
+
+logger = logging.getLogger(__name__)
+
+CYCLE_BUDGET_SECONDS = 20
+
+
+@dataclass(frozen=True)
+class Source:
+    name: str
+    fetch: Callable[[], Any]
+    deadline: float = 10
+    refresh_every: timedelta | None = None
+
+
+def _timed(source: Source):
+    def fetch():
+        started = time.perf_counter()
+        result = None
+        try:
+            with timing.stage(f"fetch.{source.name}"):
+                result = source.fetch()
+            return result
+        finally:
+            metrics.FETCH_SECONDS.observe(
+                time.perf_counter() - started, source=source.name
+            )
+            if result is None:
+                metrics.FETCH_ERRORS.inc(source=source.name)
+
+    return fetch
+
+
+def _result_or_none(future):
+    if future.cancelled() or future.exception() is not None:
+        return None
+    return future.result()
+
+
+def collect(
+    sources: list[Source],
+    budget: float = CYCLE_BUDGET_SECONDS,
+    on_result: Callable[[str, Any], None] | None = None,
+) -> dict:
+    """Run all sources concurrently and return whatever finished in time.
+
+    Each source gets its own deadline, capped by the overall cycle budget.
+    Sources that fail or miss their deadline are reported as `None`; a deadline
+    of zero starts the source without waiting for it at all. `on_result` is
+    called for every source once it finishes, even after `collect` returned.
+    """
+    started = time.monotonic()
+    results = {}
+
+    executor = ThreadPoolExecutor(max_workers=max(len(sources), 1))
+    try:
+        futures = {source.name: executor.submit(_timed(source)) for source in sources}
+        if on_result:
+            for name, future in futures.items():
+                future.add_done_callback(
+                    lambda f, name=name: on_result(name, _result_or_none(f))
+                )
+
+        for source in sorted(sources, key=lambda s: s.deadline):
+            if source.deadline == 0:
+                results[source.name] = None
+                continue
+
+            elapsed = time.monotonic() - started
+            remaining = max(min(source.deadline, budget) - elapsed, 0)
+            try:
+                results[source.name] = futures[source.name].result(timeout=remaining)
+            except TimeoutError:
+                logger.warning(
+                    "Source `%s` missed its %ss deadline", source.name, source.deadline
+                )
+                results[source.name] = None
+            except Exception as e:
+                logger.error("Source `%s` failed: %s", source.name, e)
+                results[source.name] = None
+    finally:
+        # Late sources keep running in the background, but nobody waits for them
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return results
@@ -1,23 +1,34 @@
 import logging
-
-import requests
+from datetime import timedelta
 
 from config import HOUSE_API_URL
 
+from . import http_client
+from .backoff import guarded
+from .cache import cache
+
 SELECTED_SENSORS = [
     ("sensor-up", "Salon"),
     ("sensor-master-bedroom", "Sypialnia"),
     ("sensor-kitchen", "Kuchnia"),
 ]
 
+# Shorter than the refresh interval, so every scheduled refresh asks the API;
+# the entry is there to keep the validators of the last response
+READINGS_TTL = timedelta(minutes=1)
+
 logger = logging.getLogger(__name__)
 
 
 def get_house_temperatures() -> list[dict] | None:
     try:
-        response = requests.get(HOUSE_API_URL, timeout=5)
-        response.raise_for_status()
-        readings_by_name = {r["name"]: r for r in response.json()["readings"]}
+        readings = cache(
+            "house-readings",
+            lambda expired: guarded("house-api", lambda: _load_readings(expired)),
+            ttl=READINGS_TTL,
+            revalidate=True,
+        )
+        readings_by_name = {r["name"]: r for r in readings}
         result = [
             {"label": label, "temp": readings_by_name[name]["temperature"]}
             for name, label in SELECTED_SENSORS
@@ -27,3 +38,11 @@ def get_house_temperatures() -> list[dict] | None:
     except Exception as e:
         logger.error("Failed to fetch house temperatures: %s", e)
         return None
+
+
+def _load_readings(expired=None):
+    # A sensor on the local network; two attempts fit its 6 s deadline
+    body, validators = http_client.get_json(
+        HOUSE_API_URL, expired.validators if expired else None, timeout=(1, 2)
+    )
+    return body["readings"], validators
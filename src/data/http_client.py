@@ -0,0 +1,112 @@
+"""One pooled HTTP session shared by all upstream clients.
+
+Connections are kept alive per host, so in daemon mode a cycle usually reuses
+the TCP and TLS connections of the previous one. Timeouts, retries and common
+headers are set here rather than at every call site.
+
+JSON sources fetched with `get_json` get back the `ETag` and `Last-Modified`
+of each response, to keep with their cache entry and send on the next
+request, so an unchanged resource costs a 304 instead of a full body.
+"""
+
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .cache import NotModified
+
+CONNECT_TIMEOUT = 2
+READ_TIMEOUT = 4
+DEFAULT_TIMEOUT = (CONNECT_TIMEOUT, READ_TIMEOUT)
+POOL_SIZE = 4
+USER_AGENT = "inky-home-display"
+
+# One immediate retry of a connection hiccup or a failing gateway, so even the
+# worst case of two timed-out attempts ends within the 12 s source deadline.
+# Rate limits and longer outages are left to the backoff in data.backoff, and
+# Retry-After is ignored: honouring it would hold the fetch locks for as long
+# as the upstream asks
+RETRY = Retry(
+    total=1,
+    connect=1,
+    read=0,
+    status=1,
+    backoff_factor=0,
+    status_forcelist=(502, 503, 504),
+    allowed_methods=frozenset({"GET", "POST"}),
+    respect_retry_after_header=False,
+    raise_on_status=False,
+)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _new_session():
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=RETRY
+    )
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+
+def session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = _new_session()
+        return _session
+
+
+def get(url, **kwargs):
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    return session().get(url, **kwargs)
+
+
+def post(url, **kwargs):
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    return session().post(url, **kwargs)
+
+
+def get_json(url, validators=None, params=None, **kwargs):
+    """GET `url` and return its JSON body with the response's validators.
+
+    `validators` from an earlier response are sent back as `If-None-Match`
+    and `If-Modified-Since`; when the server answers 304 this raises
+    NotModified, and no body is downloaded or parsed. The validators
+    returned are None when the response has neither `ETag` nor
+    `Last-Modified`. Other error statuses raise as with `raise_for_status`."""
+    headers = dict(kwargs.pop("headers", None) or {})
+    if validators:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    response = get(url, params=params, headers=headers, **kwargs)
+    if response.status_code == 304 and validators:
+        raise NotModified(url)
+
+    response.raise_for_status()
+    body = response.json()
+    if response.status_code != 200:
+        return body, None
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if not (etag or last_modified):
+        return body, None
+    return body, {"etag": etag, "last_modified": last_modified}
+
+
+def close():
+    """Drop the pooled connections, e.g. when the daemon shuts down."""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
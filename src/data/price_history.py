@@ -0,0 +1,195 @@
+"""Append-only history of daily energy prices.
+
+The file is a short header followed by one row of 96 little-endian doubles
+per day, in quarter-hours of local wall-clock time. Row `i` holds the prices
+of the first day plus `i` days; days that were never recorded and quarters
+that do not exist on daylight saving days are NaN. The rows are read through
+a memory map, so queries over months of history are plain NumPy operations.
+"""
+
+import logging
+import os
+import struct
+import threading
+from datetime import date, timedelta
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+HISTORY_DIR = os.path.join(os.path.dirname(__file__), "..", "history")
+HISTORY_FILE = "prices.f64"
+
+QUARTERS = 96
+MAGIC = b"INKYPH01"
+_HEADER = struct.Struct("<8sq")
+_ROW = np.dtype("<f8")
+ROW_BYTES = QUARTERS * _ROW.itemsize
+
+_write_lock = threading.Lock()
+
+
+def history_file():
+    return os.path.join(HISTORY_DIR, HISTORY_FILE)
+
+
+def _wall_clock_row(prices):
+    """Fit a day of prices into 96 quarters of local wall-clock time."""
+    values = np.asarray(prices, dtype=_ROW)
+    if len(values) == 24:
+        values = np.repeat(values, 4)
+    if len(values) == QUARTERS - 4:
+        # Spring forward: 02:00-03:00 never happened
+        return np.concatenate([values[:8], np.full(4, np.nan), values[8:]])
+    if len(values) == QUARTERS + 4:
+        # Fall back: keep the first pass through 02:00-03:00
+        return np.concatenate([values[:12], values[16:]])
+    if len(values) != QUARTERS:
+        raise ValueError(f"Expected a day of prices, got {len(values)} values")
+    return values
+
+
+def record(day, prices, path=None):
+    """Store the prices of `day`, filling any days missed since the last one.
+
+    Recording a day that is already stored overwrites its row in place."""
+    path = path or history_file()
+    row = _wall_clock_row(prices)
+    with _write_lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        mode = "r+b" if os.path.exists(path) else "w+b"
+        with open(path, mode) as f:
+            header = f.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                f.seek(0)
+                f.truncate()
+                f.write(_HEADER.pack(MAGIC, day.toordinal()))
+                first_day = day.toordinal()
+            else:
+                magic, first_day = _HEADER.unpack(header)
+                if magic != MAGIC:
+                    raise ValueError(f"{path} is not a price history file")
+
+            index = day.toordinal() - first_day
+            if index < 0:
+                logger.debug("Not recording %s, history starts later", day)
+                return
+
+            rows = (f.seek(0, os.SEEK_END) - _HEADER.size) // ROW_BYTES
+            if index < rows:
+                f.seek(_HEADER.size + index * ROW_BYTES)
+                f.write(row.tobytes())
+                return
+
+            # Drop a partly written last row before appending after it
+            end = f.truncate(_HEADER.size + rows * ROW_BYTES)
+            f.seek(end)
+            gap = np.full((index - rows, QUARTERS), np.nan, dtype=_ROW)
+            f.write(gap.tobytes() + row.tobytes())
+
+
+class PriceHistory:
+    """Read-only view of the price history, one row per day."""
+
+    def __init__(self, first_day, rows):
+        self.first_day = first_day
+        self.rows = rows
+
+    @classmethod
+    def open(cls, path=None):
+        path = path or history_file()
+        try:
+            with open(path, "rb") as f:
+                magic, first_day = _HEADER.unpack(f.read(_HEADER.size))
+            size = os.path.getsize(path)
+        except (FileNotFoundError, struct.error):
+            return cls(None, np.empty((0, QUARTERS), dtype=_ROW))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a price history file")
+
+        count = (size - _HEADER.size) // ROW_BYTES
+        if count == 0:
+            return cls(date.fromordinal(first_day), np.empty((0, QUARTERS), _ROW))
+        rows = np.memmap(
+            path, dtype=_ROW, mode="r", offset=_HEADER.size, shape=(count, QUARTERS)
+        )
+        return cls(date.fromordinal(first_day), rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _index(self, day):
+        return day.toordinal() - self.first_day.toordinal()
+
+    def day(self, day):
+        """Prices of `day`, NaN where nothing was recorded."""
+        if self.first_day is None or not 0 <= self._index(day) < len(self.rows):
+            return np.full(QUARTERS, np.nan)
+        return np.array(self.rows[self._index(day)])
+
+    def window(self, end, days):
+        """Rows of the `days` days up to and including `end`, oldest first."""
+        result = np.full((days, QUARTERS), np.nan)
+        if self.first_day is None:
+            return result
+        stop = self._index(end) + 1
+        start = stop - days
+        source = self.rows[max(start, 0) : max(min(stop, len(self.rows)), 0)]
+        offset = max(-start, 0)
+        result[offset : offset + len(source)] = source
+        return result
+
+    def daily_averages(self, end, days):
+        """Mean price of each of the `days` days up to `end`, NaN if unknown."""
+        rows = self.window(end, days)
+        counts = np.sum(~np.isnan(rows), axis=1)
+        sums = np.nansum(rows, axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, sums / counts, np.nan)
+
+    def rolling_average(self, end, days, window=7):
+        """Average of each day's prices over the `window` days before it."""
+        rows = self.window(end, days + window - 1)
+        counts = np.cumsum(np.sum(~np.isnan(rows), axis=1))
+        sums = np.cumsum(np.nansum(rows, axis=1))
+        counts = counts[window - 1 :] - np.concatenate([[0], counts[:-window]])
+        sums = sums[window - 1 :] - np.concatenate([[0.0], sums[:-window]])
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, sums / counts, np.nan)
+
+    def percentiles(self, end, days, q):
+        """Percentiles `q` of every recorded price in the `days` days up to `end`."""
+        values = self.window(end, days)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return np.full(np.shape(q), np.nan)
+        return np.percentile(values, q)
+
+    def same_weekday(self, day, weeks=4):
+        """Rows of the same weekday in the `weeks` weeks before `day`, newest first."""
+        result = np.full((weeks, QUARTERS), np.nan)
+        if self.first_day is None:
+            return result
+        indices = self._index(day) - 7 * np.arange(1, weeks + 1)
+        valid = (indices >= 0) & (indices < len(self.rows))
+        result[valid] = self.rows[indices[valid]]
+        return result
+
+
+def price_distribution(end=None, days=30, min_days=7, path=None):
+    """Deciles of the prices of the `days` days before today, or up to `end`.
+
+    Empty until at least `min_days` of those days have been recorded, which
+    is not enough history rather than a failure to collect it."""
+    end = end or date.today() - timedelta(days=1)
+    history = PriceHistory.open(path)
+    recorded = np.sum(~np.isnan(history.daily_averages(end, days)))
+    if recorded < min_days:
+        return {}
+    deciles = history.percentiles(end, days, np.arange(0, 101, 10))
+    return {"days": int(recorded), "deciles": [float(d) for d in deciles]}
+
+
+def percentile_rank(price, deciles):
+    """Share of historical prices (0-100) at or below `price`."""
+    return float(np.interp(price, deciles, np.arange(0, 101, 10)))
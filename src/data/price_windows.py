@@ -0,0 +1,69 @@
+"""Cheapest times to run appliances, found in quarter-hour prices.
+
+Prices are a flat list of quarters, today's first and tomorrow's after them
+when they are known, so quarter 96 is tomorrow 00:00. Every search is a
+single pass over the prices, cheap enough to run for several durations on
+every cycle.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+QUARTER_MINUTES = 15
+
+
+@dataclass(frozen=True)
+class PriceWindow:
+    start: int
+    end: int
+    average: float
+
+
+def _quarters(minutes):
+    return -(-minutes // QUARTER_MINUTES)
+
+
+def cheapest_windows(prices, durations, start=0):
+    """Cheapest contiguous window for each of `durations` (in minutes).
+
+    Only quarters from `start` on are considered, so past quarters of today
+    are never suggested. Returns a dict of duration to PriceWindow, or to
+    None when not enough prices are known to fit it."""
+    values = np.asarray(prices[start:], dtype=float)
+    # Sum of any window is a difference of two running totals
+    totals = np.concatenate([[0.0], np.cumsum(values)])
+
+    windows = {}
+    for minutes in durations:
+        quarters = _quarters(minutes)
+        if quarters <= 0 or quarters > len(values):
+            windows[minutes] = None
+            continue
+        sums = totals[quarters:] - totals[:-quarters]
+        best = int(np.argmin(sums))
+        windows[minutes] = PriceWindow(
+            start=start + best,
+            end=start + best + quarters,
+            average=float(sums[best] / quarters),
+        )
+    return windows
+
+
+def cheapest_window(prices, minutes, start=0):
+    """Cheapest contiguous window lasting `minutes`, or None if it cannot fit."""
+    return cheapest_windows(prices, [minutes], start)[minutes]
+
+
+def cheapest_quarters(prices, count, start=0):
+    """The `count` cheapest quarters from `start` on, in time order.
+
+    For loads that can be paused, like charging a car, which do not need one
+    contiguous window."""
+    values = np.asarray(prices[start:], dtype=float)
+    if count <= 0:
+        return []
+    if count >= len(values):
+        return list(range(start, start + len(values)))
+    picked = np.argpartition(values, count - 1)[:count]
+    return sorted(start + int(index) for index in picked)
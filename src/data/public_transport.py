@@ -1,92 +1,271 @@
-import requests
 import logging
-from datetime import datetime
+from collections.abc import Callable
 from concurrent.futures import ThreadPoolExecutor
-from .cache import cache
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import requests
+
 from config import (
-    BUS_STOP_SITE_ID,
-    BUS_STOP_WALK_MINUTES,
-    TRAIN_STOP_SITE_ID,
-    TRAIN_STOP_WALK_MINUTES,
+    TRANSPORT_END_HOUR,
+    TRANSPORT_HORIZON_MINUTES,
+    TRANSPORT_RULES,
+    TRANSPORT_START_HOUR,
 )
 
+from . import http_client
+from .backoff import UpstreamBackoff, guarded
+from .cache import NotModified, cache
+
 logger = logging.getLogger(__name__)
 
-CACHE_INTERVAL_MINUTES = 10
+CACHE_KEY = "sl-departures"
+# How long to wait before asking again when no departure is coming
+EMPTY_RETRY_MINUTES = 10
+FAILED_RETRY_MINUTES = 2
+MORNING_START_HOUR = TRANSPORT_START_HOUR
+MORNING_END_HOUR = TRANSPORT_END_HOUR
+HORIZON_MINUTES = TRANSPORT_HORIZON_MINUTES
+# Departures asked for from SL; enough to always have a first one to show
+FORECAST_MINUTES = 60
+# Stops are fetched in parallel, but never more than this many at once
+MAX_FETCH_WORKERS = 4
 
 
-def get_morning_departures_cached(now):
-    cache_key = _generate_cache_key(now)
-    return cache(cache_key, lambda: get_morning_departures(now))
+@dataclass(frozen=True)
+class StopRule:
+    site_id: int
+    walk_minutes: int
+    transport_mode: str | None = None
+    line: str | None = None
+    destination: str | None = None
+    destination_contains: str | None = None
 
 
-def get_morning_departures(now):
-    if not _is_morning_hours(now):
-        return []
+@dataclass(frozen=True)
+class CompiledStop:
+    site_id: int
+    # Filters SL applies before sending departures
+    query: dict
+    # Walk time of the first rule a raw departure matches, or None
+    match: Callable[[dict], int | None]
 
-    with ThreadPoolExecutor(max_workers=2) as executor:
-        bus_future = executor.submit(_fetch_departures, BUS_STOP_SITE_ID)
-        train_future = executor.submit(_fetch_departures, TRAIN_STOP_SITE_ID)
 
-        bus_departures = bus_future.result()
-        train_departures = train_future.result()
+def compile_rule(rule):
+    """Turn a rule into a predicate over raw SL departures, checking only the
+    fields the rule sets."""
+    checks = []
+    if rule.transport_mode is not None:
+        mode = rule.transport_mode
+        checks.append(lambda d: d.get("line", {}).get("transport_mode") == mode)
+    if rule.line is not None:
+        line = str(rule.line)
+        checks.append(lambda d: d.get("line", {}).get("designation") == line)
+    if rule.destination is not None:
+        destination = rule.destination
+        checks.append(lambda d: d.get("destination") == destination)
+    if rule.destination_contains is not None:
+        part = rule.destination_contains
+        checks.append(lambda d: part in d.get("destination", ""))
+
+    return lambda departure: all(check(departure) for check in checks)
 
-    filtered_buses = [dep for dep in bus_departures if _is_expected_bus_departure(dep)]
-    filtered_trains = [
-        dep for dep in train_departures if _is_expected_train_departure(dep)
-    ]
 
-    all_departures = [
-        _transform_departure(dep, BUS_STOP_WALK_MINUTES, now) for dep in filtered_buses
+def compile_stops(rules):
+    """Group rules by stop, with one SL query and one matcher for each stop."""
+    by_site = {}
+    for rule in rules:
+        if not isinstance(rule, StopRule):
+            rule = StopRule(**rule)
+        by_site.setdefault(rule.site_id, []).append(rule)
+
+    return [
+        CompiledStop(site_id, _server_query(site_rules), _matcher(site_rules))
+        for site_id, site_rules in by_site.items()
     ]
-    all_departures.extend(
-        [_transform_departure(dep, TRAIN_STOP_WALK_MINUTES, now) for dep in filtered_trains]
+
+
+def _server_query(rules):
+    # SL filters on mode and line but not on destination, so only what every
+    # rule of the stop agrees on is sent and the rest is checked here
+    query = {"forecast": FORECAST_MINUTES}
+    modes = {rule.transport_mode for rule in rules}
+    if len(modes) == 1 and None not in modes:
+        query["transport"] = modes.pop()
+    lines = {rule.line for rule in rules}
+    if len(lines) == 1 and None not in lines:
+        line = str(lines.pop())
+        if line.isdigit():
+            query["line"] = int(line)
+    return query
+
+
+def _matcher(rules):
+    predicates = [(compile_rule(rule), rule.walk_minutes) for rule in rules]
+
+    def match(departure):
+        for predicate, walk_minutes in predicates:
+            if predicate(departure):
+                return walk_minutes
+        return None
+
+    return match
+
+
+STOPS = compile_stops(TRANSPORT_RULES)
+
+
+def get_morning_departures_cached(now):
+    # The cache holds every matching departure; which ones are shown and
+    # which are missed is worked out on each read, so the entry only needs
+    # refreshing when a departure leaves
+    failed = []
+
+    def refresh(expired):
+        departures, validators, failed_sites = _matching_departures(now, expired)
+        failed.extend(failed_sites)
+        return departures, validators
+
+    departures = cache(
+        CACHE_KEY,
+        refresh,
+        ttl=lambda departures: _cache_ttl(departures, now, retry_soon=bool(failed)),
+        keep_empty=True,
+        revalidate=True,
     )
+    return _select_departures(departures, now)
+
+
+def get_morning_departures(now):
+    departures, _, _ = _matching_departures(now)
+    return _select_departures(departures, now)
+
+
+def _matching_departures(now, expired=None):
+    """Matching departures of all stops, the validators of each stop and the
+    stops that could not be fetched.
+
+    A stop SL reports unchanged, or that cannot be reached, keeps its
+    departures from the `expired` entry. When every stop is unchanged this
+    raises NotModified, and when none can be reached the error of the last."""
+    if not _is_morning_hours(now) or not STOPS:
+        return [], None, []
+
+    # Keyed by string, as the cache stores them in JSON
+    validators = (expired.validators if expired else None) or {}
+    with ThreadPoolExecutor(max_workers=min(MAX_FETCH_WORKERS, len(STOPS))) as executor:
+        futures = [
+            executor.submit(
+                _fetch_departures,
+                stop.site_id,
+                stop.query,
+                validators.get(str(stop.site_id)),
+            )
+            for stop in STOPS
+        ]
+
+    fetched = []
+    failed = []
+    error = None
+    for stop, future in zip(STOPS, futures):
+        try:
+            fetched.append((stop, *future.result()))
+        except UpstreamBackoff as e:
+            logger.info(f"Skipping departures for site {stop.site_id}: {e}")
+            failed.append(stop.site_id)
+            error = e
+        except (requests.exceptions.RequestException, requests.exceptions.JSONDecodeError) as e:
+            logger.error(f"Error fetching departures for site {stop.site_id}: {e}")
+            failed.append(stop.site_id)
+            error = e
+    if not fetched:
+        raise error
+    if not failed and all(departures is None for _, departures, _ in fetched):
+        raise NotModified(CACHE_KEY)
+
+    all_departures = []
+    fresh_validators = {
+        site: site_validators
+        for site, site_validators in validators.items()
+        if int(site) in failed
+    }
+    for stop, departures, stop_validators in fetched:
+        if stop_validators:
+            fresh_validators[str(stop.site_id)] = stop_validators
+        if departures is None:
+            all_departures.extend(_expired_departures(expired, stop.site_id))
+            continue
+        for departure in departures:
+            walk_minutes = stop.match(departure)
+            if walk_minutes is not None:
+                all_departures.append(
+                    _transform_departure(departure, walk_minutes, now)
+                    | {"site_id": stop.site_id}
+                )
+    for site_id in failed:
+        all_departures.extend(_expired_departures(expired, site_id))
+
     all_departures.sort(key=lambda d: d["scheduled_time"])
+    return all_departures, fresh_validators or None, failed
+
+
+def _expired_departures(expired, site_id):
+    if expired is None:
+        return []
+    return [d for d in expired.data if d.get("site_id") == site_id]
+
 
-    if not all_departures:
+def _select_departures(departures, now):
+    if not _is_morning_hours(now):
+        return []
+
+    upcoming = [
+        _with_missed_flag(departure, now)
+        for departure in departures
+        if departure["scheduled_time"] >= now
+    ]
+    if not upcoming:
         return []
 
-    result = [all_departures[0]]
+    result = [upcoming[0]]
 
-    for departure in all_departures[1:]:
+    for departure in upcoming[1:]:
         time_until_departure = (departure["scheduled_time"] - now).total_seconds() / 60
-        if time_until_departure <= 30:
+        if time_until_departure <= HORIZON_MINUTES:
             result.append(departure)
 
     return result
 
 
-def _is_morning_hours(now):
-    return 7 <= now.hour < 11
+def _with_missed_flag(departure, now):
+    time_until_departure = (departure["scheduled_time"] - now).total_seconds() / 60
+    is_missed = time_until_departure < departure["walk_time_minutes"]
+    if is_missed == departure["is_missed"]:
+        return departure
+    return departure | {"is_missed": is_missed}
 
 
-def _is_expected_bus_departure(departure):
-    line = departure.get("line", {})
-    return (
-        line.get("designation") == "605"
-        and line.get("transport_mode") == "BUS"
-        and departure.get("destination") == "Danderyds sjukhus"
-    )
+def _is_morning_hours(now):
+    return MORNING_START_HOUR <= now.hour < MORNING_END_HOUR
 
 
-def _is_expected_train_departure(departure):
-    line = departure.get("line", {})
-    destination = departure.get("destination", "")
-    return line.get("transport_mode") == "TRAM" and "Stockholms östra" in destination
+def _fetch_departures(site_id, query=None, validators=None):
+    """Raw departures of a stop and the validators of the response.
 
+    The departures are None when SL answers that nothing changed since the
+    response `validators` came from. Errors reaching the stop are raised."""
+    def request():
+        return http_client.get_json(
+            f"https://transport.integration.sl.se/v1/sites/{site_id}/departures",
+            validators,
+            params=query,
+        )
 
-def _fetch_departures(site_id):
     try:
-        response = requests.get(
-            f"https://transport.integration.sl.se/v1/sites/{site_id}/departures", timeout=10
-        )
-        response.raise_for_status()
-        data = response.json()
-        return data.get("departures", [])
-    except (requests.exceptions.RequestException, requests.exceptions.JSONDecodeError) as e:
-        logger.error(f"Error fetching departures for site {site_id}: {e}")
-        return []
+        data, fresh_validators = guarded(f"sl-site-{site_id}", request)
+    except NotModified:
+        return None, validators
+    return data.get("departures", []), fresh_validators
 
 
 def _transform_departure(raw, walk_time_minutes, now):
@@ -108,7 +287,26 @@ def _transform_departure(raw, walk_time_minutes, now):
     }
 
 
-def _generate_cache_key(now):
-    rounded_minute = (now.minute // CACHE_INTERVAL_MINUTES) * CACHE_INTERVAL_MINUTES
-    cache_time = now.replace(minute=rounded_minute, second=0, microsecond=0)
-    return cache_time.strftime("sl-departures-%Y%m%d-%H%M")
+def _cache_ttl(departures, now, retry_soon=False):
+    # Valid until the first departure leaves; with nothing coming, until the
+    # next departure could plausibly show up. Stops that could not be reached
+    # are retried shortly
+    upcoming = [d["scheduled_time"] for d in departures if d["scheduled_time"] > now]
+    if upcoming:
+        expires = min(upcoming)
+    elif _is_morning_hours(now):
+        expires = now + timedelta(minutes=EMPTY_RETRY_MINUTES)
+    else:
+        expires = _next_morning(now)
+    if retry_soon:
+        expires = min(expires, now + timedelta(minutes=FAILED_RETRY_MINUTES))
+    return expires - now
+
+
+def _next_morning(now):
+    morning = now.replace(
+        hour=MORNING_START_HOUR, minute=0, second=0, microsecond=0
+    )
+    if morning <= now:
+        morning += timedelta(days=1)
+    return morning
@@ -0,0 +1,129 @@
+import json
+import logging
+import os
+import threading
+from dataclasses import replace
+from datetime import datetime, timedelta
+
+from .cache import DateTimeEncoder, datetime_decoder, write_atomic
+from .collector import CYCLE_BUDGET_SECONDS, Source, collect
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = os.path.join(os.path.dirname(__file__), "..", "cache", "scheduler.json")
+
+
+def _slot(moment: datetime, interval: timedelta):
+    midnight = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return moment.date(), (moment - midnight) // interval
+
+
+def is_due(source: Source, fetched_at: datetime | None, now: datetime) -> bool:
+    """A source is due once the clock enters a new slot of its refresh interval.
+
+    Slots are aligned to local midnight, so a daily source is due right after
+    midnight and an hourly one at the top of every hour.
+    """
+    if fetched_at is None or source.refresh_every is None:
+        return True
+    return _slot(fetched_at, source.refresh_every) != _slot(now, source.refresh_every)
+
+
+class Scheduler:
+    """Only calls the sources that are due and remembers the rest.
+
+    The last good value of every source is kept, so a failing or slow source
+    is rendered from that value, reported in `stale`, and retried in the
+    background instead of leaving its widget blank.
+    """
+
+    def __init__(self, state_file=STATE_FILE):
+        self.state_file = state_file
+        self.state = self._load_state()
+        self._lock = threading.Lock()
+        self._collecting = False
+
+    def _load_state(self):
+        try:
+            with open(self.state_file, "r") as f:
+                return json.load(f, object_hook=datetime_decoder)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save_state(self):
+        try:
+            content = json.dumps(self.state, cls=DateTimeEncoder).encode()
+            write_atomic(self.state_file, content)
+        except (OSError, TypeError, ValueError) as e:
+            logger.error("Failed to save scheduler state: %s", e)
+
+    def _remember(self, name, value, now):
+        with self._lock:
+            entry = self.state.setdefault(name, {})
+            if value is None:
+                entry["failing"] = True
+            else:
+                entry.update(fetched_at=now, value=value, failing=False)
+            # Results within the cycle are saved together once it is collected;
+            # only those finishing in the background are saved on their own
+            if not self._collecting:
+                self._save_state()
+
+    def _finish_collecting(self):
+        with self._lock:
+            self._collecting = False
+            self._save_state()
+
+    def _last_good(self, name):
+        with self._lock:
+            return self.state.get(name, {}).get("value")
+
+    def _serve_stale(self, name):
+        with self._lock:
+            entry = self.state.get(name, {})
+            return entry.get("failing", False) and entry.get("value") is not None
+
+    def due(self, sources: list[Source], now: datetime) -> list[Source]:
+        return [
+            source
+            for source in sources
+            if is_due(source, self.state.get(source.name, {}).get("fetched_at"), now)
+        ]
+
+    def run(
+        self,
+        sources: list[Source],
+        now: datetime,
+        budget: float = CYCLE_BUDGET_SECONDS,
+    ) -> dict:
+        due_sources = self.due(sources, now)
+        logger.info(
+            "Refreshing %s", ", ".join(s.name for s in due_sources) or "nothing"
+        )
+        # A source that failed last time is not waited for: its last good value
+        # is rendered straight away while the retry runs in the background
+        due_sources = [
+            replace(source, deadline=0) if self._serve_stale(source.name) else source
+            for source in due_sources
+        ]
+        fresh = {}
+        if due_sources:
+            self._collecting = True
+            try:
+                fresh = collect(
+                    due_sources,
+                    budget,
+                    on_result=lambda name, value: self._remember(name, value, now),
+                )
+            finally:
+                self._finish_collecting()
+
+        results = {"stale": []}
+        for source in sources:
+            value = fresh.get(source.name)
+            if value is None:
+                value = self._last_good(source.name)
+                if source.name in fresh and value is not None:
+                    results["stale"].append(source.name)
+            results[source.name] = value
+        return results
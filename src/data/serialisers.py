@@ -0,0 +1,227 @@
+"""Serialisers for cache entries.
+
+An entry is a dict with the schema version under `__cache__`, the creation
+time, the TTL in seconds and the cached data, plus the upstream's validators
+for entries that can be revalidated. JSON stays readable for
+debugging; the binary format packs numbers with `struct`, so price arrays
+become plain blocks of doubles and datetimes fixed-size integers.
+"""
+
+import json
+import math
+import struct
+from datetime import datetime, timedelta, timezone
+
+
+class DateTimeEncoder(json.JSONEncoder):
+    def default(self, obj):
+        if isinstance(obj, datetime):
+            return {"__datetime__": True, "as_str": obj.isoformat()}
+        return super().default(obj)
+
+
+def datetime_decoder(dct):
+    if dct.get("__datetime__"):
+        return datetime.fromisoformat(dct["as_str"])
+    return dct
+
+
+class JsonSerialiser:
+    name = "json"
+    extension = ".json"
+
+    def dumps(self, entry):
+        return json.dumps(entry, cls=DateTimeEncoder).encode("utf-8")
+
+    def loads(self, raw):
+        return json.loads(raw, object_hook=datetime_decoder)
+
+
+_NONE = b"N"
+_TRUE = b"T"
+_FALSE = b"F"
+_INT = b"i"
+_BIG_INT = b"I"
+_FLOAT = b"f"
+_STR = b"s"
+_LIST = b"l"
+_FLOAT_ARRAY = b"a"
+_DICT = b"d"
+_NAIVE_DATETIME = b"t"
+_AWARE_DATETIME = b"z"
+
+_U32 = struct.Struct("<I")
+_I64 = struct.Struct("<q")
+_F64 = struct.Struct("<d")
+_DATETIME = struct.Struct("<iq")
+_OFFSET = struct.Struct("<i")
+_HEADER = struct.Struct("<BBdd")
+
+
+class BinarySerialiser:
+    name = "binary"
+    extension = ".bin"
+    MAGIC = b"INKYC"
+    FORMAT_VERSION = 3
+
+    def dumps(self, entry):
+        ttl = entry["ttl"]
+        parts = [
+            self.MAGIC,
+            _HEADER.pack(
+                self.FORMAT_VERSION,
+                entry["__cache__"],
+                entry["created"],
+                math.nan if ttl is None else ttl,
+            ),
+        ]
+        self._encode(entry["data"], parts)
+        self._encode(entry.get("validators"), parts)
+        return b"".join(parts)
+
+    def loads(self, raw):
+        view = memoryview(raw)
+        offset = len(self.MAGIC)
+        format_version, schema, created, ttl = _HEADER.unpack_from(view, offset)
+        if format_version not in (1, 2, self.FORMAT_VERSION):
+            raise ValueError(f"Unsupported binary cache format {format_version}")
+        data, offset = self._decode(view, offset + _HEADER.size)
+        # Before version 3 a missing TTL was written as -1, which left no way
+        # to store an already expired entry
+        no_ttl = math.isnan(ttl) if format_version > 2 else ttl < 0
+        entry = {
+            "__cache__": schema,
+            "created": created,
+            "ttl": None if no_ttl else ttl,
+            "data": data,
+        }
+        # Version 1 entries end after the data
+        if format_version > 1:
+            validators, _ = self._decode(view, offset)
+            if validators is not None:
+                entry["validators"] = validators
+        return entry
+
+    def _encode(self, value, parts):
+        if value is None:
+            parts.append(_NONE)
+        elif value is True:
+            parts.append(_TRUE)
+        elif value is False:
+            parts.append(_FALSE)
+        elif isinstance(value, int):
+            if -(2**63) <= value < 2**63:
+                parts.append(_INT + _I64.pack(value))
+            else:
+                self._encode_text(_BIG_INT, str(value), parts)
+        elif isinstance(value, float):
+            parts.append(_FLOAT + _F64.pack(value))
+        elif isinstance(value, str):
+            self._encode_text(_STR, value, parts)
+        elif isinstance(value, datetime):
+            self._encode_datetime(value, parts)
+        elif isinstance(value, (list, tuple)):
+            if value and all(type(item) is float for item in value):
+                parts.append(_FLOAT_ARRAY + _U32.pack(len(value)))
+                parts.append(struct.pack(f"<{len(value)}d", *value))
+            else:
+                parts.append(_LIST + _U32.pack(len(value)))
+                for item in value:
+                    self._encode(item, parts)
+        elif isinstance(value, dict):
+            parts.append(_DICT + _U32.pack(len(value)))
+            for key, item in value.items():
+                if not isinstance(key, str):
+                    raise TypeError(f"Cache keys must be strings, got {key!r}")
+                self._encode_text(b"", key, parts)
+                self._encode(item, parts)
+        else:
+            raise TypeError(f"Cannot cache value of type {type(value).__name__}")
+
+    @staticmethod
+    def _encode_text(tag, text, parts):
+        encoded = text.encode("utf-8")
+        parts.append(tag + _U32.pack(len(encoded)) + encoded)
+
+    @staticmethod
+    def _encode_datetime(value, parts):
+        midnight = value.replace(hour=0, minute=0, second=0, microsecond=0)
+        microseconds = (value - midnight) // timedelta(microseconds=1)
+        packed = _DATETIME.pack(value.toordinal(), microseconds)
+        offset = value.utcoffset()
+        if offset is None:
+            parts.append(_NAIVE_DATETIME + packed)
+        else:
+            parts.append(
+                _AWARE_DATETIME + packed + _OFFSET.pack(int(offset.total_seconds()))
+            )
+
+    def _decode(self, view, offset):
+        tag = bytes(view[offset : offset + 1])
+        offset += 1
+        if tag == _NONE:
+            return None, offset
+        if tag == _TRUE:
+            return True, offset
+        if tag == _FALSE:
+            return False, offset
+        if tag == _INT:
+            return _I64.unpack_from(view, offset)[0], offset + _I64.size
+        if tag == _BIG_INT:
+            text, offset = self._decode_text(view, offset)
+            return int(text), offset
+        if tag == _FLOAT:
+            return _F64.unpack_from(view, offset)[0], offset + _F64.size
+        if tag == _STR:
+            return self._decode_text(view, offset)
+        if tag == _FLOAT_ARRAY:
+            (count,) = _U32.unpack_from(view, offset)
+            offset += _U32.size
+            values = list(struct.unpack_from(f"<{count}d", view, offset))
+            return values, offset + count * _F64.size
+        if tag == _LIST:
+            (count,) = _U32.unpack_from(view, offset)
+            offset += _U32.size
+            items = []
+            for _ in range(count):
+                item, offset = self._decode(view, offset)
+                items.append(item)
+            return items, offset
+        if tag == _DICT:
+            (count,) = _U32.unpack_from(view, offset)
+            offset += _U32.size
+            result = {}
+            for _ in range(count):
+                key, offset = self._decode_text(view, offset)
+                result[key], offset = self._decode(view, offset)
+            return result, offset
+        if tag in (_NAIVE_DATETIME, _AWARE_DATETIME):
+            ordinal, microseconds = _DATETIME.unpack_from(view, offset)
+            offset += _DATETIME.size
+            value = datetime.fromordinal(ordinal) + timedelta(
+                microseconds=microseconds
+            )
+            if tag == _AWARE_DATETIME:
+                (seconds,) = _OFFSET.unpack_from(view, offset)
+                offset += _OFFSET.size
+                value = value.replace(tzinfo=timezone(timedelta(seconds=seconds)))
+            return value, offset
+        raise ValueError(f"Unknown tag {tag!r} in binary cache entry")
+
+    @staticmethod
+    def _decode_text(view, offset):
+        (length,) = _U32.unpack_from(view, offset)
+        offset += _U32.size
+        return str(view[offset : offset + length], "utf-8"), offset + length
+
+
+SERIALISERS = {
+    serialiser.name: serialiser for serialiser in (JsonSerialiser(), BinarySerialiser())
+}
+
+
+def serialiser_for(raw):
+    """Pick the serialiser that wrote `raw`, so both formats stay readable."""
+    if raw.startswith(BinarySerialiser.MAGIC):
+        return SERIALISERS["binary"]
+    return SERIALISERS["json"]
@@ -1,29 +1,83 @@
 import asyncio
 import logging
+import threading
+from contextlib import AsyncExitStack
 
 import tmodbus
 
 from config import THERMIA_HOST, THERMIA_PORT, THERMIA_UNIT_ID
 
+from .backoff import guarded
+
 logger = logging.getLogger(__name__)
 
+# In daemon mode the heat pump is read every cycle, so the client stays
+# connected between reads on an event loop of its own instead of being set up
+# and torn down each time. Both are only touched from that loop's thread.
+_loop = None
+_loop_lock = threading.Lock()
+_connection = None
+
 
 def _decode_signed_16bit(val: int) -> int:
     return val - 0x10000 if val >= 0x8000 else val
 
 
+def _event_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=_loop.run_forever, name="thermia", daemon=True
+            ).start()
+    return _loop
+
+
+async def _connected_client():
+    global _connection
+    if _connection is None:
+        client = tmodbus.create_async_tcp_client(
+            THERMIA_HOST, port=THERMIA_PORT, unit_id=THERMIA_UNIT_ID
+        )
+        stack = AsyncExitStack()
+        await stack.enter_async_context(client)
+        _connection = (client, stack)
+    return _connection[0]
+
+
+async def _disconnect() -> None:
+    global _connection
+    if _connection is None:
+        return
+    _, stack = _connection
+    _connection = None
+    try:
+        await stack.aclose()
+    except OSError as e:
+        logger.debug("Failed to close thermia connection: %s", e)
+
+
 async def _read_outdoor_temp_async() -> float:
-    client = tmodbus.create_async_tcp_client(
-        THERMIA_HOST, port=THERMIA_PORT, unit_id=THERMIA_UNIT_ID
-    )
-    async with client:
+    client = await _connected_client()
+    try:
         raw = await client.read_input_registers(start_address=13, quantity=1)
+    except Exception:
+        # Reconnect on the next read rather than reuse a broken connection
+        await _disconnect()
+        raise
     return _decode_signed_16bit(raw[0]) / 100.0
 
 
+def _read_outdoor_temp() -> float:
+    return asyncio.run_coroutine_threadsafe(
+        _read_outdoor_temp_async(), _event_loop()
+    ).result()
+
+
 def get_outdoor_temp() -> float | None:
     try:
-        return asyncio.run(_read_outdoor_temp_async())
+        return guarded("thermia", _read_outdoor_temp)
     except Exception as e:
         logger.error("Failed to read thermia outdoor temp: %s", e)
         return None
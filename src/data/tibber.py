@@ -1,42 +1,95 @@
+import copy
 import functools
 import json
 import logging
-from datetime import datetime
+import re
+import threading
+from datetime import datetime, timedelta
 
-import requests
+from config import TIBBER_PRICES_HOME, TIBBER_STATS_HOME
 
-from .cache import cache
+from . import http_client, price_history
+from .backoff import guarded
+from .cache import cache, next_slot, peek, store
 from .tokens import read_token_file
 
 logger = logging.getLogger(__name__)
 
+# Tibber publishes the next day's prices in the early afternoon
+TOMORROW_PUBLISHED_HOUR = 13
+
+# Homes kept fresh together, by id or app nickname; None is the first home on
+# the account that has the data asked for
+HOMES = tuple(dict.fromkeys([TIBBER_PRICES_HOME, TIBBER_STATS_HOME]))
+
+HOME_FIELDS = "id appNickname"
+PRICES_SELECTION = (
+    "currentSubscription { priceInfo(resolution:QUARTER_HOURLY)"
+    "{today {total startsAt} tomorrow {total startsAt}}}"
+)
+
+# Hourly series summed into the day's stats, with the money field of each
+STATS_SERIES = {"consumption": "cost", "production": "profit"}
+
+# Held while deciding what is due and fetching it, so concurrent misses for
+# prices and stats share a single request
+_fetch_lock = threading.Lock()
+
 
 @functools.lru_cache(maxsize=1)
 def load_token():
     return read_token_file("tibber-api-token", "Unable to load Tibber token")
 
 
-def load_prices_from_tibber():
-    query = (
-        "{ viewer { homes { currentSubscription { priceInfo(resolution:QUARTER_HOURLY){today {total startsAt}}}}}}"
-    )
+def build_query(*selections):
+    """Merge per-home selections into a single GraphQL query for all homes."""
+    return "{ viewer { homes { " + " ".join((HOME_FIELDS, *selections)) + " }}}"
+
+
+def _home_suffix(home):
+    if home is None:
+        return ""
+    return "-" + re.sub(r"[^A-Za-z0-9]+", "_", home)
 
-    response_json = load_data_from_tibber(load_token(), query)
 
+def _select_home(response_json, home, has_data, what):
     homes = response_json.get("data", {}).get("viewer", {}).get("homes", [])
     if not homes:
-        logger.debug("Tibber prices response: %s", json.dumps(response_json))
+        logger.debug("Tibber %s response: %s", what, json.dumps(response_json))
         raise RuntimeError("No homes found in Tibber API response")
 
-    home = next((h for h in homes if h.get("currentSubscription") is not None), None)
     if home is None:
+        return next((h for h in homes if has_data(h)), None)
+
+    selected = next(
+        (h for h in homes if home in (h.get("id"), h.get("appNickname"))), None
+    )
+    if selected is None:
+        logger.debug("Tibber %s response: %s", what, json.dumps(response_json))
+        raise RuntimeError(f"Tibber home `{home}` not found in Tibber API response")
+    return selected if has_data(selected) else None
+
+
+def load_prices_from_tibber(home=None):
+    response_json = load_data_from_tibber(load_token(), build_query(PRICES_SELECTION))
+    return _prices_from_response(response_json, home)
+
+
+def _prices_from_response(response_json, home=None):
+    selected = _select_home(
+        response_json,
+        home,
+        lambda h: h.get("currentSubscription") is not None,
+        "prices",
+    )
+    if selected is None:
         logger.debug("Tibber prices response: %s", json.dumps(response_json))
         raise RuntimeError(
             "No active subscription found in Tibber API response. "
             "Please check your Tibber account status."
         )
 
-    current_subscription = home.get("currentSubscription")
+    current_subscription = selected.get("currentSubscription")
 
     price_info = current_subscription.get("priceInfo")
     if price_info is None:
@@ -48,68 +101,150 @@ def load_prices_from_tibber():
         logger.debug("Tibber prices response: %s", json.dumps(response_json))
         raise RuntimeError("No prices available for today in Tibber API response")
 
+    # The history follows the home on the price panel
+    if home == TIBBER_PRICES_HOME:
+        _record_history(today_prices)
+
     return list(map(lambda _: _["total"], today_prices))
 
 
-def load_day_stats_from_tibber():
-    query = (
-        "{ viewer { homes { "
-        "consumption(resolution: HOURLY, last: 24) { nodes { from to cost consumption }}"
-        "production(resolution: HOURLY, last: 24) { nodes { from to profit production }}"
-        "}}}"
+def _tomorrow_from_response(response_json, home=None):
+    """Tomorrow's prices in the response, or an empty list until published."""
+    selected = _select_home(
+        response_json,
+        home,
+        lambda h: h.get("currentSubscription") is not None,
+        "prices",
     )
+    price_info = ((selected or {}).get("currentSubscription") or {}).get("priceInfo")
+    tomorrow_prices = (price_info or {}).get("tomorrow") or []
+    if tomorrow_prices and home == TIBBER_PRICES_HOME:
+        _record_history(tomorrow_prices)
+    return [price["total"] for price in tomorrow_prices]
+
+
+def _record_history(prices):
+    try:
+        day = datetime.fromisoformat(prices[0]["startsAt"]).date()
+        price_history.record(day, [price["total"] for price in prices])
+    except (LookupError, ValueError, OSError) as e:
+        logger.warning("Failed to record price history: %s", e)
+
+
+def _prices_key(day, home=None):
+    return f"tibber-prices{_home_suffix(home)}-{day.strftime('%Y%m%d')}"
+
+
+def _stats_key(home=None):
+    return f"tibber-stats{_home_suffix(home)}"
+
+
+def _stats_state_key(home=None):
+    return f"tibber-stats-day{_home_suffix(home)}"
+
+
+def _until_end_of_day(day):
+    now = datetime.now()
+    end_of_day = datetime.combine(day.date(), datetime.min.time()) + timedelta(days=1)
+    return end_of_day - now
+
 
+def stats_selection(now, homes=(None,)):
+    """Consumption and production selections covering the hours not yet seen
+    for any of `homes`."""
+    states = [_stats_state(now, home) for home in homes]
+
+    def hours(series):
+        return max(_hours_to_fetch(state["seen"][series], now) for state in states)
+
+    return "".join(
+        f"{series}(resolution: HOURLY, last: {hours(series)}) "
+        f"{{ nodes {{ from {amount} {series} }}}}"
+        for series, amount in STATS_SERIES.items()
+    )
+
+
+def _stats_state(now, home=None):
+    # Totals of the hours already summed today and the last hour seen per series.
+    # A copy, as peek hands out the cached object itself and a fetch that fails
+    # halfway must not leave its hours counted
+    state = copy.deepcopy(peek(_stats_state_key(home)))
+    if state is None or state["day"] != now.date().isoformat():
+        return {
+            "day": now.date().isoformat(),
+            "seen": {series: None for series in STATS_SERIES},
+            "totals": {"production": 0, "profit": 0, "consumption": 0, "cost": 0},
+        }
+    return state
+
+
+def _hours_to_fetch(last_seen, now):
+    hours_today = now.hour + 1
+    if last_seen is None:
+        return hours_today
+    # One hour of overlap, so a node published late is not missed
+    elapsed = now.astimezone() - datetime.fromisoformat(last_seen)
+    return max(1, min(hours_today, int(elapsed / timedelta(hours=1))))
+
+
+def load_day_stats_from_tibber(home=None):
+    query = build_query(stats_selection(datetime.now(), [home]))
     response_json = load_data_from_tibber(load_token(), query)
+    return _stats_from_response(response_json, home)
 
-    homes = response_json.get("data", {}).get("viewer", {}).get("homes", [])
-    if not homes:
-        logger.debug("Tibber stats response: %s", json.dumps(response_json))
-        raise RuntimeError("No homes found in Tibber API response")
 
-    data = next(
-        (h for h in homes if h.get("consumption") is not None or h.get("production") is not None),
-        None,
+def _stats_from_response(response_json, home=None):
+    data = _select_home(
+        response_json,
+        home,
+        lambda h: h.get("consumption") is not None
+        or h.get("production") is not None,
+        "stats",
     )
     if data is None:
         logger.debug("Tibber stats response: %s", json.dumps(response_json))
         raise RuntimeError("No energy data found in Tibber API response")
 
     now = datetime.now()
-    def today(date):
-        return date.day == now.day
-
-    stats = {"production": 0, "profit": 0, "consumption": 0, "cost": 0}
+    state = _stats_state(now, home)
+    totals = state["totals"]
+
+    for series, amount in STATS_SERIES.items():
+        seen = state["seen"][series]
+        last_seen = datetime.fromisoformat(seen) if seen is not None else None
+        for n in (data.get(series) or {}).get("nodes", []):
+            start = datetime.fromisoformat(n["from"])
+            # Nodes carry the home's offset, so their date is the home's day
+            if start.date() != now.date():
+                continue
+            if last_seen is not None and start <= last_seen:
+                continue
+            if n.get(series) is None:
+                # Not metered yet, ask for this hour again next time
+                break
+            totals[series] += n[series]
+            if n.get(amount):
+                totals[amount] += n[amount]
+            seen, last_seen = n["from"], start
+        state["seen"][series] = seen
+
+    store(_stats_state_key(home), state, ttl=next_slot(now, timedelta(days=1)) - now)
+    return dict(totals)
 
-    production_data = data.get("production", {})
-    production_nodes = production_data.get("nodes", [])
-    for n in production_nodes:
-        if today(datetime.fromisoformat(n["from"])):
-            if n["production"]:
-                stats["production"] += n["production"]
-            if n["profit"]:
-                stats["profit"] += n["profit"]
 
-    consumption_data = data.get("consumption", {})
-    consumption_nodes = consumption_data.get("nodes", [])
-    for n in consumption_nodes:
-        if today(datetime.fromisoformat(n["from"])):
-            if n["consumption"]:
-                stats["consumption"] += n["consumption"]
-            if n["cost"]:
-                stats["cost"] += n["cost"]
-
-    return stats
+def load_data_from_tibber(token, query):
+    return guarded("tibber", lambda: _post_to_tibber(token, query))
 
 
-def load_data_from_tibber(token, query):
-    response = requests.post(
+def _post_to_tibber(token, query):
+    response = http_client.post(
         "https://api.tibber.com/v1-beta/gql",
         headers={
             "Content-Type": "application/json",
             "Authorization": f"Bearer {token}",
         },
         json={"query": query},
-    timeout=10)
+    )
 
     if response.status_code != 200:
         logger.debug("Tibber response body: %s", response.text)
@@ -125,22 +260,105 @@ def load_data_from_tibber(token, query):
     return response_json
 
 
-def tibber_energy_prices():
-    try:
-        return cache(
-            f"tibber-prices-{datetime.now().strftime('%Y%m%d')}", load_prices_from_tibber
+def _entries(now, homes):
+    """Cache key, TTL and parser of each entry Tibber serves, per home."""
+    entries = {}
+    tomorrow = now + timedelta(days=1)
+    for home in homes:
+        entries["prices", home] = (
+            _prices_key(now, home),
+            next_slot(now, timedelta(days=1)) - now,
+            functools.partial(_prices_from_response, home=home),
+        )
+        if now.hour >= TOMORROW_PUBLISHED_HOUR:
+            # Stored ahead of time so the midnight rollover is a cache hit
+            entries["tomorrow", home] = (
+                _prices_key(tomorrow, home),
+                _until_end_of_day(tomorrow),
+                functools.partial(_tomorrow_from_response, home=home),
+            )
+        entries["stats", home] = (
+            _stats_key(home),
+            next_slot(now, timedelta(hours=1)) - now,
+            functools.partial(_stats_from_response, home=home),
         )
+    return entries
+
+
+def _query_for(due, now):
+    selections = []
+    if any(name in ("prices", "tomorrow") for name, _ in due):
+        selections.append(PRICES_SELECTION)
+    stats_homes = [home for name, home in due if name == "stats"]
+    if stats_homes:
+        selections.append(stats_selection(now, stats_homes))
+    return build_query(*selections)
+
+
+def _load_due(wanted, now):
+    """Fetch the `wanted` entry along with every other one that is due.
+
+    Tibber answers for all homes of the account at once, so on a cold cycle
+    prices and stats of every configured home go out as one combined query
+    and the response is split into their cache entries.
+    """
+    with _fetch_lock:
+        entries = _entries(now, dict.fromkeys((*HOMES, wanted[1])))
+        cached = peek(entries[wanted][0])
+        if cached is not None:
+            # Stored by a combined request made while we waited for the lock
+            return cached
+
+        due = {
+            name: entry
+            for name, entry in entries.items()
+            if name == wanted or peek(entry[0]) is None
+        }
+        response_json = load_data_from_tibber(load_token(), _query_for(due, now))
+
+        for name, (key, ttl, parse) in due.items():
+            if name == wanted:
+                continue
+            try:
+                data = parse(response_json)
+            except (RuntimeError, LookupError, TypeError, ValueError) as e:
+                logger.warning("Failed to read Tibber %s from response: %s", name, e)
+                continue
+            if data != []:
+                store(key, data, ttl=ttl)
+
+        return entries[wanted][2](response_json)
+
+
+def tibber_energy_prices(home=TIBBER_PRICES_HOME):
+    now = datetime.now()
+    key, ttl, _ = _entries(now, [home])["prices", home]
+    try:
+        return cache(key, lambda: _load_due(("prices", home), now), ttl=ttl)
     except Exception as e:
         logger.error("Failed to fetch Tibber energy prices: %s", e)
         return None
 
 
-def tibber_energy_stats():
+def tibber_energy_prices_tomorrow(home=TIBBER_PRICES_HOME):
+    """Tomorrow's prices, or an empty list while they are not published yet."""
+    now = datetime.now()
+    if now.hour < TOMORROW_PUBLISHED_HOUR:
+        return []
+
+    key, ttl, _ = _entries(now, [home])["tomorrow", home]
     try:
-        return cache(
-            f"tibber-stats-{datetime.now().strftime('%Y%m%d-%H')}",
-            load_day_stats_from_tibber,
-        )
+        return cache(key, lambda: _load_due(("tomorrow", home), now), ttl=ttl)
+    except Exception as e:
+        logger.error("Failed to fetch Tibber energy prices for tomorrow: %s", e)
+        return None
+
+
+def tibber_energy_stats(home=TIBBER_STATS_HOME):
+    now = datetime.now()
+    key, ttl, _ = _entries(now, [home])["stats", home]
+    try:
+        return cache(key, lambda: _load_due(("stats", home), now), ttl=ttl)
     except Exception as e:
         logger.error("Failed to fetch Tibber energy stats: %s", e)
         return None
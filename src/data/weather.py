@@ -1,10 +1,16 @@
 import functools
-from datetime import datetime
-
-import requests
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 
+from . import http_client
+from .backoff import guarded
+from .cache import cache
 from .tokens import read_token_file
 
+CURRENT_TTL = timedelta(minutes=10)
+# Forecast steps are 3 hours apart; the list is only renewed when one passes
+FORECAST_STEP = timedelta(hours=3)
+
 
 @functools.lru_cache(maxsize=1)
 def load_token():
@@ -12,24 +18,50 @@ def load_token():
 
 
 def get_weather():
-    def parse_forecast(item):
-        return {
-            "time": datetime.fromtimestamp(item["dt"]),
-            "temp": item["main"]["temp"],
-            "icon": item["weather"][0]["icon"],
-        }
+    """Current conditions and forecast, each cached for as long as it holds.
+
+    When both have expired they are fetched in parallel, and each is only
+    downloaded again if OpenWeather says it changed."""
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        current = executor.submit(
+            cache,
+            "openweather-current",
+            lambda expired: guarded("openweather", lambda: _load_current(expired)),
+            ttl=CURRENT_TTL,
+            revalidate=True,
+        )
+        forecast = cache(
+            "openweather-forecast",
+            lambda expired: guarded("openweather", lambda: _load_forecast(expired)),
+            ttl=_forecast_ttl,
+            revalidate=True,
+        )
+        weather = current.result()
+    return weather | {"forecast": forecast}
+
+
+def _forecast_ttl(forecast):
+    # Valid until the first forecast step is reached and drops off the list
+    if not forecast:
+        return FORECAST_STEP
+    return max(forecast[0]["time"] - datetime.now(), CURRENT_TTL)
 
-    payload = {
+
+def _payload():
+    return {
         "lat": "59.4308",
         "lon": "18.0637",
         "units": "metric",
         "appid": load_token(),
     }
 
-    r = requests.get(
-        "https://api.openweathermap.org/data/2.5/weather", params=payload, timeout=10
+
+def _load_current(expired=None):
+    current_weather, validators = http_client.get_json(
+        "https://api.openweathermap.org/data/2.5/weather",
+        expired.validators if expired else None,
+        params=_payload(),
     )
-    current_weather = r.json()
     weather = {
         "name": current_weather["name"],
         "sunrise": datetime.fromtimestamp(current_weather["sys"]["sunrise"]),
@@ -39,13 +71,20 @@ def get_weather():
             "icon": current_weather["weather"][0]["icon"],
         },
     }
+    return weather, validators
+
+
+def _load_forecast(expired=None):
+    def parse_forecast(item):
+        return {
+            "time": datetime.fromtimestamp(item["dt"]),
+            "temp": item["main"]["temp"],
+            "icon": item["weather"][0]["icon"],
+        }
 
-    forecast_payload = payload | {"cnt": 8}
-    r = requests.get(
+    forecast, validators = http_client.get_json(
         "https://api.openweathermap.org/data/2.5/forecast",
-        params=forecast_payload,
-        timeout=10,
+        expired.validators if expired else None,
+        params=_payload() | {"cnt": 8},
     )
-    forecast = r.json()
-    weather["forecast"] = list(map(parse_forecast, forecast["list"]))
-    return weather
+    return list(map(parse_forecast, forecast["list"])), validators
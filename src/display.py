@@ -1,7 +1,14 @@
 import locale
+import time
+
+import metrics
+import timing
 
 from PIL import ImageDraw
 
+from config import CHEAPEST_WINDOW_MINUTES
+from data.price_history import percentile_rank
+from data.price_windows import cheapest_window
 from display_backend import create_backend
 from fonts import FontLoader
 from widgets import (
@@ -18,6 +25,7 @@ from widgets import (
     HouseTempsViewData,
     HouseTempsWidget,
     Rectangle,
+    StaleMarkerWidget,
     TranslatedDraw,
     TransportViewData,
     TransportWidget,
@@ -37,10 +45,28 @@ LAYOUT = {
     "footer": Rectangle(200, 287, 200, 13),
 }
 
+# Panels that change on every cycle without the data changing; a frame that
+# differs only there does not refresh the display
+VOLATILE_PANELS = ("footer",)
+
+# Panel that gets a stale marker when a source is shown from its last good value
+STALE_MARKERS = {
+    "energy_prices": "energy_graph",
+    "energy_stats": "energy_stats",
+    "transport": "transport",
+    "weather": "weather",
+    "heatpump_outdoor_temp": "weather",
+    "house_temps": "house_temps",
+}
+
 
 def render_widget(widget, draw, colours):
     translated_draw = TranslatedDraw(draw, widget.bounds.x, widget.bounds.y)
-    widget.render(translated_draw, colours)
+    widget_name = type(widget).__name__
+    started = time.perf_counter()
+    with timing.stage(f"render.{widget_name}"):
+        widget.render(translated_draw, colours)
+    metrics.RENDER_SECONDS.observe(time.perf_counter() - started, widget=widget_name)
 
 
 def create_header_widget(bounds, data, font_loader):
@@ -51,12 +77,28 @@ def create_energy_price_widgets(graph_bounds, labels_bounds, data, font_loader):
     if not data.get("energy_prices"):
         return []
 
+    current_quarter = (data["current_time"].hour * 4) + (
+        data["current_time"].minute // 15
+    )
     price_data = EnergyPriceData(
         day_prices=data["energy_prices"],
-        current_quarter=(data["current_time"].hour * 4)
-        + (data["current_time"].minute // 15),
+        current_quarter=current_quarter,
     )
 
+    if CHEAPEST_WINDOW_MINUTES:
+        prices = data["energy_prices"] + (data.get("energy_prices_tomorrow") or [])
+        window = cheapest_window(prices, CHEAPEST_WINDOW_MINUTES, start=current_quarter)
+        if window is not None:
+            price_data.cheapest_window = (window.start, window.end)
+
+    history = data.get("energy_price_history")
+    if history:
+        deciles = history["deciles"]
+        price_data.history_range = (deciles[1], deciles[9])
+        price_data.now_percentile = percentile_rank(
+            data["energy_prices"][current_quarter], deciles
+        )
+
     return [
         EnergyPriceGraphWidget(graph_bounds, price_data),
         EnergyPriceLabelsWidget(labels_bounds, font_loader, price_data),
@@ -130,33 +172,57 @@ def create_transport_widget(bounds, data, font_loader):
     return [TransportWidget(bounds, font_loader, transport_data)]
 
 
-def generate_content(draw, data, colours):
-    font_loader = FontLoader()
+def create_stale_marker_widgets(data):
+    panels = {
+        STALE_MARKERS[source]
+        for source in data.get("stale", [])
+        if source in STALE_MARKERS and data.get(source)
+    }
+    return [StaleMarkerWidget(LAYOUT[panel]) for panel in sorted(panels)]
+
+
+def generate_content(draw, data, colours, font_loader=None):
+    font_loader = font_loader or FontLoader()
     locale.setlocale(locale.LC_ALL, "pl_PL.utf8")
 
     widgets = []
-    widgets.extend(create_header_widget(LAYOUT["header"], data, font_loader))
-    widgets.extend(
-        create_energy_price_widgets(
-            LAYOUT["energy_graph"], LAYOUT["price_labels"], data, font_loader
+    with timing.stage("build.header"):
+        widgets.extend(create_header_widget(LAYOUT["header"], data, font_loader))
+    with timing.stage("build.energy_prices"):
+        widgets.extend(
+            create_energy_price_widgets(
+                LAYOUT["energy_graph"], LAYOUT["price_labels"], data, font_loader
+            )
         )
-    )
-    widgets.extend(create_energy_stats_widget(LAYOUT["energy_stats"], data, font_loader))
-    widgets.extend(create_transport_widget(LAYOUT["transport"], data, font_loader))
-    widgets.extend(create_weather_widget(LAYOUT["weather"], data, font_loader))
-    widgets.extend(create_house_temps_widget(LAYOUT["house_temps"], data, font_loader))
-    widgets.extend(create_footer_widget(LAYOUT["footer"], data, font_loader))
+    with timing.stage("build.energy_stats"):
+        widgets.extend(
+            create_energy_stats_widget(LAYOUT["energy_stats"], data, font_loader)
+        )
+    with timing.stage("build.transport"):
+        widgets.extend(create_transport_widget(LAYOUT["transport"], data, font_loader))
+    with timing.stage("build.weather"):
+        widgets.extend(create_weather_widget(LAYOUT["weather"], data, font_loader))
+    with timing.stage("build.house_temps"):
+        widgets.extend(
+            create_house_temps_widget(LAYOUT["house_temps"], data, font_loader)
+        )
+    with timing.stage("build.footer"):
+        widgets.extend(create_footer_widget(LAYOUT["footer"], data, font_loader))
+    widgets.extend(create_stale_marker_widgets(data))
 
     for widget in widgets:
         render_widget(widget, draw, colours)
 
 
-def display(data, prefer_inky=True, png_output_path="img/test.png"):
-    backend = create_backend(prefer_inky, png_output_path)
+def display(
+    data, prefer_inky=True, png_output_path="img/test.png", backend=None, font_loader=None
+):
+    backend = backend or create_backend(prefer_inky, png_output_path)
 
     img = backend.create_image()
     draw = ImageDraw.Draw(img)
     colours = backend.colors
 
-    generate_content(draw, data, colours)
-    backend.show(img)
+    generate_content(draw, data, colours, font_loader)
+    pushed = backend.show(img, volatile=[LAYOUT[name] for name in VOLATILE_PANELS])
+    metrics.FRAMES.inc(result="pushed" if pushed else "skipped")
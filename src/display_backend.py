@@ -1,8 +1,55 @@
 """Display backend abstraction for different output methods."""
 
+import hashlib
+import os
 from abc import ABC, abstractmethod
 from PIL import Image
 
+import timing
+
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "cache")
+
+
+class FrameFingerprint:
+    """Fingerprint of the last frame pushed to an output, persisted across runs."""
+
+    def __init__(self, path):
+        self.path = path
+
+    @staticmethod
+    def of(image, exclude=()):
+        """Hash of the frame with the `exclude` rectangles blanked out."""
+        if exclude:
+            image = image.copy()
+            for region in exclude:
+                image.paste(0, (region.x, region.y, region.right, region.bottom))
+        return hashlib.sha256(image.tobytes()).hexdigest()
+
+    def matches(self, fingerprint):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return f.read().strip() == fingerprint
+        except OSError:
+            return False
+
+    def save(self, fingerprint):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                f.write(fingerprint)
+        except OSError as e:
+            print(f"Could not save frame fingerprint: {e}")
+
+
+class NullFingerprint:
+    """Fingerprint that never matches, for outputs that must show every frame."""
+
+    def matches(self, fingerprint):
+        return False
+
+    def save(self, fingerprint):
+        pass
+
 
 class DisplayBackend(ABC):
     """Abstract base class for display backends."""
@@ -22,15 +69,21 @@ class DisplayBackend(ABC):
         """Create and return a PIL Image for drawing."""
 
     @abstractmethod
-    def show(self, image):
-        """Display the given image on the output device."""
+    def show(self, image, volatile=()):
+        """Display the given image on the output device.
+
+        Returns False when the frame is identical to the last one shown and
+        the output was left untouched. Changes inside the `volatile`
+        rectangles, like the time of the update, do not count as changes.
+        """
 
 
 class PngFileBackend(DisplayBackend):
     """Backend that saves output as PNG file."""
 
-    def __init__(self, output_path="img/test.png"):
+    def __init__(self, output_path="img/test.png", fingerprint=None):
         self.output_path = output_path
+        self.fingerprint = fingerprint or FrameFingerprint(output_path + ".sha256")
 
     @property
     def resolution(self):
@@ -43,15 +96,26 @@ class PngFileBackend(DisplayBackend):
     def create_image(self):
         return Image.new("P", size=self.resolution, color=(255, 255, 255))
 
-    def show(self, image):
-        image.save(self.output_path, format="PNG")
+    def show(self, image, volatile=()):
+        fingerprint = FrameFingerprint.of(image, volatile)
+        if os.path.exists(self.output_path) and self.fingerprint.matches(fingerprint):
+            print(f"Image unchanged, keeping {self.output_path}")
+            return False
+
+        with timing.stage("output.png_encode"):
+            image.save(self.output_path, format="PNG")
+        self.fingerprint.save(fingerprint)
         print(f"Image saved to {self.output_path}")
+        return True
 
 
 class InkyBackend(DisplayBackend):
     """Backend for Pimoroni Inky display hardware."""
 
-    def __init__(self):
+    def __init__(self, fingerprint=None):
+        self.fingerprint = fingerprint or FrameFingerprint(
+            os.path.join(CACHE_DIR, "inky-frame.sha256")
+        )
         try:
             from inky.auto import auto
 
@@ -77,20 +141,33 @@ class InkyBackend(DisplayBackend):
     def create_image(self):
         return Image.new("P", self.resolution)
 
-    def show(self, image):
+    def show(self, image, volatile=()):
+        # A full refresh of the three-colour panel is slow and flashes,
+        # so only do it when the frame actually changed
+        fingerprint = FrameFingerprint.of(image, volatile)
+        if self.fingerprint.matches(fingerprint):
+            print("Frame unchanged, skipping display refresh")
+            return False
+
         self.inky_display.set_border(self.inky_display.WHITE)
-        self.inky_display.set_image(image)
-        self.inky_display.show()
+        with timing.stage("output.inky_set_image"):
+            self.inky_display.set_image(image)
+        with timing.stage("output.inky_show"):
+            self.inky_display.show()
+        self.fingerprint.save(fingerprint)
+        return True
 
 
-def create_backend(prefer_inky=True, png_output_path="out/test.png"):
+def create_backend(
+    prefer_inky=True, png_output_path="out/test.png", fingerprint=None
+):
     """Create the appropriate display backend based on availability."""
 
     if prefer_inky:
         try:
-            return InkyBackend()
+            return InkyBackend(fingerprint)
         except (ImportError, RuntimeError) as e:
             print(f"Could not initialize Inky backend: {e}")
             print("Falling back to PNG file output")
 
-    return PngFileBackend(png_output_path)
+    return PngFileBackend(png_output_path, fingerprint)
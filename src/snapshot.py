@@ -0,0 +1,19 @@
+"""Snapshots of collected data for rendering without touching the network."""
+
+import json
+import os
+
+from data.cache import DateTimeEncoder, datetime_decoder
+
+
+def save_snapshot(data, path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, cls=DateTimeEncoder, ensure_ascii=False, indent=2)
+
+
+def load_snapshot(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f, object_hook=datetime_decoder)
@@ -0,0 +1,108 @@
+"""Per-stage wall and CPU timings of a refresh cycle, logged as JSON lines."""
+
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+TIMINGS_FILE = os.path.join(os.path.dirname(__file__), "metrics", "timings.jsonl")
+MAX_FILE_BYTES = 1_000_000
+BACKUP_COUNT = 5
+
+logger = logging.getLogger(__name__)
+
+
+class CycleTimings:
+    def __init__(self):
+        self.started_at = datetime.now()
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, wall, cpu):
+        with self._lock:
+            stage = self.stages.setdefault(name, {"wall": 0.0, "cpu": 0.0, "count": 0})
+            stage["wall"] += wall
+            stage["cpu"] += cpu
+            stage["count"] += 1
+
+    @contextmanager
+    def stage(self, name):
+        # thread_time only counts the current thread, so stages running in
+        # the collector's worker threads get their own CPU time
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            self.record(
+                name,
+                time.perf_counter() - wall_start,
+                time.thread_time() - cpu_start,
+            )
+
+    def as_record(self):
+        with self._lock:
+            stages = {
+                name: {
+                    "wall_ms": round(stage["wall"] * 1000, 3),
+                    "cpu_ms": round(stage["cpu"] * 1000, 3),
+                    "count": stage["count"],
+                }
+                for name, stage in self.stages.items()
+            }
+        return {"started_at": self.started_at.isoformat(), "stages": stages}
+
+
+_current = None
+_writers = {}
+
+
+def start_cycle():
+    global _current
+    _current = CycleTimings()
+    return _current
+
+
+@contextmanager
+def stage(name):
+    """Time a stage of the current cycle; does nothing outside of a cycle."""
+    cycle = _current
+    if cycle is None:
+        yield
+        return
+    with cycle.stage(name):
+        yield
+
+
+def _get_writer(path):
+    if path not in _writers:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        writer = logging.getLogger(f"timings.{path}")
+        writer.propagate = False
+        writer.setLevel(logging.INFO)
+        handler = RotatingFileHandler(
+            path, maxBytes=MAX_FILE_BYTES, backupCount=BACKUP_COUNT
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        writer.addHandler(handler)
+        _writers[path] = writer
+    return _writers[path]
+
+
+def finish_cycle(path=TIMINGS_FILE):
+    """Write the current cycle as one JSON line and return its record."""
+    global _current
+    cycle, _current = _current, None
+    if cycle is None:
+        return None
+
+    record = cycle.as_record()
+    try:
+        _get_writer(path).info(json.dumps(record))
+    except OSError as e:
+        logger.error("Failed to write timings: %s", e)
+    return record
@@ -3,26 +3,113 @@
 import argparse
 import logging
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from display import display
+import metrics
+import timing
+from daemon import Daemon
+from data import http_client
+from data.cache import evict_if_due, evict_in_background
+from data.collector import Source
 from data.house_sensors import get_house_temperatures
+from data.price_history import price_distribution
 from data.public_transport import get_morning_departures_cached
+from data.scheduler import Scheduler
 from data.thermia import get_outdoor_temp
-from data.tibber import tibber_energy_prices, tibber_energy_stats
+from data.tibber import (
+    tibber_energy_prices,
+    tibber_energy_prices_tomorrow,
+    tibber_energy_stats,
+)
 from data.weather import get_weather
+from display import display
+from display_backend import NullFingerprint, create_backend
+from fonts import FontLoader
+from snapshot import load_snapshot, save_snapshot
+
+
+def data_sources(current_time):
+    return [
+        Source(
+            "energy_prices",
+            tibber_energy_prices,
+            deadline=12,
+            refresh_every=timedelta(days=1),
+        ),
+        Source(
+            "energy_prices_tomorrow",
+            tibber_energy_prices_tomorrow,
+            deadline=12,
+            refresh_every=timedelta(hours=1),
+        ),
+        Source(
+            "energy_price_history",
+            price_distribution,
+            deadline=2,
+            refresh_every=timedelta(days=1),
+        ),
+        Source(
+            "energy_stats",
+            tibber_energy_stats,
+            deadline=12,
+            refresh_every=timedelta(hours=1),
+        ),
+        Source(
+            "weather", get_weather, deadline=12, refresh_every=timedelta(minutes=10)
+        ),
+        Source(
+            "transport",
+            lambda: get_morning_departures_cached(current_time),
+            deadline=12,
+            refresh_every=timedelta(minutes=1),
+        ),
+        Source(
+            "heatpump_outdoor_temp",
+            get_outdoor_temp,
+            deadline=5,
+            refresh_every=timedelta(minutes=15),
+        ),
+        Source(
+            "house_temps",
+            get_house_temperatures,
+            deadline=6,
+            refresh_every=timedelta(minutes=5),
+        ),
+    ]
 
-def collect_data():
+
+def collect_data(scheduler=None):
+    scheduler = scheduler or Scheduler()
     current_time = datetime.now()
-    return {
-        "current_time": current_time,
-        "energy_prices": tibber_energy_prices(),
-        "energy_stats": tibber_energy_stats(),
-        "weather": get_weather(),
-        "transport": get_morning_departures_cached(current_time),
-        "heatpump_outdoor_temp": get_outdoor_temp(),
-        "house_temps": get_house_temperatures(),
-    }
+    sources = data_sources(current_time)
+    return {"current_time": current_time} | scheduler.run(sources, current_time)
+
+
+def run_cycle(refresh, background_eviction=False):
+    timing.start_cycle()
+    try:
+        with timing.stage("cycle"):
+            refresh()
+    finally:
+        timing.finish_cycle()
+        # A one-shot run exits right after the cycle, which would kill an
+        # eviction thread, so it evicts before returning instead
+        if background_eviction:
+            evict_in_background()
+        else:
+            evict_if_due()
+
+
+def replay(snapshot_path, repeat=1, prefer_inky=True, output_path="out/test.png"):
+    """Render a recorded snapshot `repeat` times, outputting every frame.
+
+    The frames are all identical, so the backend does not fingerprint them;
+    otherwise every repeat after the first would skip the output stage."""
+    data = load_snapshot(snapshot_path)
+    backend = create_backend(prefer_inky, output_path, fingerprint=NullFingerprint())
+    font_loader = FontLoader()
+    for _ in range(repeat):
+        run_cycle(lambda: display(data, backend=backend, font_loader=font_loader))
 
 
 def main():
@@ -35,13 +122,90 @@ def main():
     parser.add_argument(
         "--output", default="out/test.png", help="PNG output file path (default: out/test.png)"
     )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="Keep running and refresh the display on an internal schedule",
+    )
+    parser.add_argument(
+        "--interval",
+        type=int,
+        default=900,
+        help="Seconds between refreshes in daemon mode (default: 900)",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="Serve Prometheus metrics on this port in daemon mode",
+    )
+    parser.add_argument(
+        "--metrics-host",
+        default="127.0.0.1",
+        help="Address for the metrics endpoint (default: 127.0.0.1)",
+    )
+    parser.add_argument(
+        "--record",
+        metavar="PATH",
+        help="Save the collected data of each refresh to a snapshot file",
+    )
+    parser.add_argument(
+        "--replay",
+        metavar="PATH",
+        help="Render from a snapshot file instead of fetching data",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=1,
+        help="Number of times to render the snapshot with --replay (default: 1)",
+    )
     args = parser.parse_args()
+    if args.replay and (args.daemon or args.record):
+        parser.error("--replay cannot be combined with --daemon or --record")
 
     logging.basicConfig(level=logging.INFO)
     if not os.getenv("DEBUG"):
         logging.getLogger("pymodbus").setLevel(logging.WARNING)
 
-    display(collect_data(), prefer_inky=not args.png_only, png_output_path=args.output)
+    def gather(scheduler=None):
+        data = collect_data(scheduler)
+        if args.record:
+            save_snapshot(data, args.record)
+        return data
+
+    if args.replay:
+        replay(args.replay, args.repeat, not args.png_only, args.output)
+        return
+
+    if not args.daemon:
+        run_cycle(
+            lambda: display(
+                gather(),
+                prefer_inky=not args.png_only,
+                png_output_path=args.output,
+            )
+        )
+        return
+
+    if args.metrics_port:
+        metrics.start_server(args.metrics_host, args.metrics_port)
+
+    # Created once so fonts and the display connection stay warm between cycles
+    backend = create_backend(not args.png_only, args.output)
+    font_loader = FontLoader()
+    scheduler = Scheduler()
+
+    def refresh():
+        display(gather(scheduler), backend=backend, font_loader=font_loader)
+
+    daemon = Daemon(
+        lambda: run_cycle(refresh, background_eviction=True), args.interval
+    )
+    daemon.install_signal_handlers()
+    try:
+        daemon.run()
+    finally:
+        http_client.close()
 
 
 if __name__ == "__main__":
@@ -7,7 +7,7 @@ from .energy import (
     EnergyStatsWidget,
 )
 from .house_temps import HouseTempReading, HouseTempsViewData, HouseTempsWidget
-from .layout import FooterWidget, HeaderWidget
+from .layout import FooterWidget, HeaderWidget, StaleMarkerWidget
 from .transport import DepartureViewData, TransportViewData, TransportWidget
 from .weather import ForecastItem, WeatherViewData, WeatherWidget
 
@@ -26,6 +26,7 @@ __all__ = [
     "HouseTempsViewData",
     "HouseTempsWidget",
     "Rectangle",
+    "StaleMarkerWidget",
     "TranslatedDraw",
     "TransportViewData",
     "TransportWidget",
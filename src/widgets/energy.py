@@ -16,6 +16,12 @@ class EnergyData:
 class EnergyPriceData:
     day_prices: list[float]
     current_quarter: int
+    # Typical range of the last 30 days and where the current price falls in
+    # it, when enough history is recorded
+    history_range: tuple[float, float] | None = None
+    now_percentile: float | None = None
+    # First quarter and the quarter after the last of the cheapest window
+    cheapest_window: tuple[int, int] | None = None
 
 
 class EnergyStatsWidget(Widget):
@@ -77,6 +83,28 @@ class EnergyPriceLabelsWidget(Widget):
             fill=colours[0],
         )
 
+        if self.price_data.history_range is not None:
+            self._render_history(draw, colours, font)
+
+    def _render_history(self, draw: DrawProtocol, colours: list, font) -> None:
+        low, high = self.price_data.history_range
+        history_range_text = f"30 d: {round(low, 2)} -- {round(high, 2)} SEK"
+        draw.text(
+            (self.bounds.width, 0),
+            history_range_text,
+            font=font,
+            fill=colours[0],
+            anchor="ra",
+        )
+        if self.price_data.now_percentile is not None:
+            draw.text(
+                (self.bounds.width, 14),
+                f"now at p{self.price_data.now_percentile:.0f}",
+                font=font,
+                fill=colours[0],
+                anchor="ra",
+            )
+
 
 class EnergyPriceGraphWidget(Widget):
     def __init__(self, bounds: Rectangle, price_data: EnergyPriceData):
@@ -91,6 +119,8 @@ class EnergyPriceGraphWidget(Widget):
         price_max = max(self.price_data.day_prices)
         self._draw_reference_lines(draw, colours, price_max)
         self._draw_price_bars(draw, colours)
+        if self.price_data.cheapest_window is not None:
+            self._draw_cheapest_window(draw, colours)
 
     def _draw_reference_lines(
         self, draw: DrawProtocol, colours: list, price_max: float
@@ -136,3 +166,16 @@ class EnergyPriceGraphWidget(Widget):
                 )
 
             draw.rectangle([bar_left, bar_top, bar_right, bar_bottom], fill=colours[0])
+
+    def _draw_cheapest_window(self, draw: DrawProtocol, colours: list) -> None:
+        # Only the part that falls on today's bars; a window starting tomorrow
+        # is not marked
+        start, end = self.price_data.cheapest_window
+        end = min(end, len(self.price_data.day_prices))
+        if start >= end:
+            return
+
+        bar_step = 2
+        left = bar_step * (start + 1) - 1
+        right = bar_step * end + 1
+        draw.rectangle([left, 2, right, 3], fill=colours[1])
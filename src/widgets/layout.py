@@ -43,3 +43,17 @@ class FooterWidget(Widget):
         x = self.bounds.width - now_size[2]
         y = self.bounds.height - now_size[3]
         draw.text((x, y), now_text, font=font, fill=colours[1])
+
+
+class StaleMarkerWidget(Widget):
+    """Corner mark on a panel that shows the last known value of a failing source."""
+
+    SIZE = 6
+
+    def render(self, draw: DrawProtocol, colours: list) -> None:
+        right = self.bounds.width - 1
+        draw.rectangle(
+            [right - self.SIZE, 0, right, self.SIZE],
+            fill=colours[1],
+            outline=colours[0],
+        )
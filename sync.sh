@@ -3,6 +3,8 @@ rsync -arv --delete \
  --exclude '__pycache__/' \
  --exclude '.DS_Store' \
  --exclude 'cache/' \
+ --exclude 'history/' \
+ --exclude 'metrics/' \
  --exclude '*.egg-info/' \
  --exclude '.env' \
  src/ jagoda.mm:/opt/home-display/inky/
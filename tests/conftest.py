@@ -0,0 +1,12 @@
+import pytest
+
+import data.cache
+import data.price_history
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(tmp_path, monkeypatch):
+    """Keep cache entries, backoff state and price history out of src."""
+    monkeypatch.setattr(data.cache, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(data.price_history, "HISTORY_DIR", str(tmp_path / "history"))
+    data.cache.clear_memory_cache()
@@ -0,0 +1,57 @@
+from datetime import timedelta
+from unittest.mock import Mock, patch
+
+import pytest
+
+from data.backoff import UpstreamBackoff, guarded, retry_delay
+from data.cache import NotModified
+
+
+class WhenUpstreamFails:
+    def it_does_not_call_the_upstream_again_within_the_backoff_window(self):
+        operation = Mock(side_effect=RuntimeError("503"))
+
+        with pytest.raises(RuntimeError, match="503"):
+            guarded("tibber", operation)
+        with pytest.raises(UpstreamBackoff):
+            guarded("tibber", operation)
+
+        assert operation.call_count == 1
+
+    def it_probes_the_upstream_again_after_the_backoff_window(self):
+        operation = Mock(side_effect=[RuntimeError("503"), "prices"])
+
+        with pytest.raises(RuntimeError):
+            guarded("tibber", operation)
+        with patch("data.backoff.time.time", return_value=4102444800):
+            assert guarded("tibber", operation) == "prices"
+
+    def it_resets_after_a_successful_probe(self):
+        operation = Mock(side_effect=[RuntimeError("503"), "ok", "ok again"])
+
+        with pytest.raises(RuntimeError):
+            guarded("sl-site-2216", operation)
+        with patch("data.backoff.time.time", return_value=4102444800):
+            guarded("sl-site-2216", operation)
+
+        assert guarded("sl-site-2216", operation) == "ok again"
+
+    def it_counts_an_unchanged_answer_as_a_success(self):
+        operation = Mock(side_effect=[NotModified, "ok"])
+
+        with pytest.raises(NotModified):
+            guarded("openweather", operation)
+
+        assert guarded("openweather", operation) == "ok"
+
+    def it_keeps_upstreams_separate(self):
+        with pytest.raises(RuntimeError):
+            guarded("openweather", Mock(side_effect=RuntimeError("down")))
+
+        assert guarded("house-api", lambda: "readings") == "readings"
+
+    def it_doubles_the_delay_up_to_a_limit(self):
+        assert retry_delay(1) == timedelta(seconds=30)
+        assert retry_delay(2) == timedelta(seconds=60)
+        assert retry_delay(5) == timedelta(minutes=8)
+        assert retry_delay(20) == timedelta(minutes=30)
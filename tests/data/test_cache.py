@@ -1,7 +1,27 @@
+import fcntl
 import json
-from data.cache import cache
-from unittest.mock import patch
-from datetime import datetime
+import os
+import subprocess
+import sys
+import threading
+import time
+import data.cache
+from data.cache import (
+    Expired,
+    NotModified,
+    cache,
+    clear_memory_cache,
+    evict,
+    evict_if_due,
+    evict_in_background,
+    next_slot,
+)
+from unittest.mock import Mock, patch
+from datetime import datetime, timedelta
+
+import pytest
+
+SRC_DIR = os.path.dirname(os.path.dirname(data.cache.__file__))
 
 class TestCacheFunction:
     def test_should_return_cached_data_when_cache_file_exists(self, tmp_path):
@@ -72,7 +92,7 @@ class TestCacheFunction:
 
         # Assert
         cache_content = json.loads(cache_file_path.read_text())
-        assert cache_content == operation_data
+        assert cache_content["data"] == operation_data
 
     def test_should_not_save_empty_array_to_cache_file(self, tmp_path):
         # Arrange
@@ -142,4 +162,315 @@ class TestCacheFunction:
         # Assert
         assert second_result == original_data
         assert isinstance(second_result[0]["time"], datetime)
-        assert second_result[0]["time"].hour == 9
\ No newline at end of file
+        assert second_result[0]["time"].hour == 9
+
+
+class TestCacheExpiry:
+    def test_should_store_creation_time_ttl_and_version(self, tmp_path):
+        cache_file_path = tmp_path / "ttl_cache.json"
+
+        with patch("data.cache.os.path.join", return_value=str(cache_file_path)):
+            cache("ttl_cache", lambda: {"a": 1}, ttl=timedelta(minutes=10))
+
+        entry = json.loads(cache_file_path.read_text())
+        assert entry["__cache__"] == 1
+        assert entry["ttl"] == 600
+        assert abs(entry["created"] - time.time()) < 5
+
+    def test_should_return_cached_data_before_ttl_expires(self, tmp_path):
+        cache_file_path = tmp_path / "fresh_cache.json"
+
+        with patch("data.cache.os.path.join", return_value=str(cache_file_path)):
+            cache("fresh_cache", lambda: {"v": 1}, ttl=timedelta(minutes=10))
+            result = cache("fresh_cache", lambda: {"v": 2}, ttl=timedelta(minutes=10))
+
+        assert result == {"v": 1}
+
+    def test_should_refresh_data_after_ttl_expires(self, tmp_path):
+        cache_file_path = tmp_path / "expired_cache.json"
+        cache_file_path.write_text(
+            json.dumps(
+                {"__cache__": 1, "created": time.time() - 601, "ttl": 600, "data": 1}
+            )
+        )
+
+        with patch("data.cache.os.path.join", return_value=str(cache_file_path)):
+            result = cache("expired_cache", lambda: 2, ttl=timedelta(minutes=10))
+
+        assert result == 2
+        assert json.loads(cache_file_path.read_text())["data"] == 2
+
+    def test_should_derive_ttl_from_the_fresh_data(self, tmp_path):
+        cache_file_path = tmp_path / "derived_ttl.json"
+
+        with patch("data.cache.os.path.join", return_value=str(cache_file_path)):
+            cache("derived_ttl", lambda: [5], ttl=lambda data: timedelta(minutes=data[0]))
+
+        assert json.loads(cache_file_path.read_text())["ttl"] == 300
+
+    def test_should_keep_empty_array_when_asked_to(self, tmp_path):
+        cache_file_path = tmp_path / "kept_empty.json"
+
+        with patch("data.cache.os.path.join", return_value=str(cache_file_path)):
+            cache("kept_empty", list, ttl=timedelta(minutes=1), keep_empty=True)
+            result = cache("kept_empty", lambda: [1], ttl=timedelta(minutes=1))
+
+        assert result == []
+        assert json.loads(cache_file_path.read_text())["data"] == []
+
+    def test_should_store_validators_with_a_revalidated_entry(self, tmp_path):
+        cache_file_path = tmp_path / "validated.json"
+        operation = Mock(return_value=({"v": 1}, {"etag": '"v1"'}))
+
+        with patch("data.cache.os.path.join", return_value=str(cache_file_path)):
+            result = cache("validated", operation, revalidate=True)
+
+        operation.assert_called_once_with(None)
+        assert result == {"v": 1}
+        assert json.loads(cache_file_path.read_text())["validators"] == {"etag": '"v1"'}
+
+    def test_should_extend_an_unmodified_entry_for_another_ttl(self, tmp_path):
+        cache_file_path = tmp_path / "unmodified.json"
+        created = time.time() - 601
+        cache_file_path.write_text(
+            json.dumps(
+                {
+                    "__cache__": 1,
+                    "created": created,
+                    "ttl": 600,
+                    "data": {"v": 1},
+                    "validators": {"etag": '"v1"'},
+                }
+            )
+        )
+        operation = Mock(side_effect=NotModified)
+
+        with patch("data.cache.os.path.join", return_value=str(cache_file_path)):
+            result = cache(
+                "unmodified", operation, ttl=timedelta(minutes=10), revalidate=True
+            )
+
+        operation.assert_called_once_with(Expired({"v": 1}, {"etag": '"v1"'}))
+        assert result == {"v": 1}
+        entry = json.loads(cache_file_path.read_text())
+        assert entry["created"] > created
+        assert entry["validators"] == {"etag": '"v1"'}
+        assert sorted(path.name for path in tmp_path.iterdir()) == [
+            "unmodified.json",
+            "unmodified.json.lock",
+        ]
+
+    def test_should_ignore_entries_with_unknown_schema_version(self, tmp_path):
+        cache_file_path = tmp_path / "future_cache.json"
+        cache_file_path.write_text(
+            json.dumps({"__cache__": 99, "created": time.time(), "ttl": None, "data": 1})
+        )
+
+        with patch("data.cache.os.path.join", return_value=str(cache_file_path)):
+            result = cache("future_cache", lambda: 2)
+
+        assert result == 2
+
+    def test_next_slot_is_aligned_to_midnight(self):
+        assert next_slot(datetime(2025, 11, 8, 8, 17), timedelta(minutes=10)) == (
+            datetime(2025, 11, 8, 8, 20)
+        )
+        assert next_slot(datetime(2025, 11, 8, 23, 50), timedelta(days=1)) == (
+            datetime(2025, 11, 9, 0, 0)
+        )
+
+
+class TestCacheEviction:
+    def _make_file(self, directory, name, age_seconds, size=10):
+        path = directory / name
+        path.write_bytes(b"x" * size)
+        mtime = time.time() - age_seconds
+        os.utime(path, (mtime, mtime))
+        return path
+
+    def test_should_remove_files_older_than_max_age(self, tmp_path):
+        old = self._make_file(tmp_path, "sl-departures-20251108-0810.json", 4 * 86400)
+        recent = self._make_file(tmp_path, "tibber-stats.json", 60)
+
+        removed = evict(str(tmp_path), max_age=timedelta(days=3))
+
+        assert removed == 1
+        assert not old.exists()
+        assert recent.exists()
+
+    def test_should_remove_oldest_files_when_over_size_limit(self, tmp_path):
+        oldest = self._make_file(tmp_path, "a.json", 300, size=100)
+        middle = self._make_file(tmp_path, "b.json", 200, size=100)
+        newest = self._make_file(tmp_path, "c.json", 100, size=100)
+
+        evict(str(tmp_path), max_bytes=250)
+
+        assert not oldest.exists()
+        assert middle.exists()
+        assert newest.exists()
+
+    def test_should_not_run_eviction_again_within_interval(self, tmp_path):
+        old = self._make_file(tmp_path, "old.json", 10 * 86400)
+
+        evict_in_background(str(tmp_path)).join()
+        self._make_file(tmp_path, "old-again.json", 10 * 86400)
+        second = evict_in_background(str(tmp_path))
+
+        assert not old.exists()
+        assert second is None
+
+    def test_should_evict_before_a_one_shot_process_exits(self, tmp_path):
+        old = [
+            self._make_file(tmp_path, f"old-{i}.json", 10 * 86400) for i in range(20)
+        ]
+
+        subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                (
+                    "import sys; from data.cache import evict_if_due; "
+                    "evict_if_due(sys.argv[1])"
+                ),
+                str(tmp_path),
+            ],
+            check=True,
+            env=os.environ | {"PYTHONPATH": SRC_DIR},
+        )
+
+        assert not any(path.exists() for path in old)
+        assert (tmp_path / data.cache.EVICTION_MARKER).exists()
+
+    def test_should_mark_eviction_only_after_the_pass(self, tmp_path):
+        with (
+            patch("data.cache.evict", side_effect=RuntimeError("interrupted")),
+            pytest.raises(RuntimeError),
+        ):
+            evict_if_due(str(tmp_path))
+
+        assert not (tmp_path / data.cache.EVICTION_MARKER).exists()
+        assert evict_if_due(str(tmp_path)) == 0
+
+
+class TestMemoryTier:
+    def test_should_serve_repeated_reads_from_memory(self, tmp_path):
+        cache_file_path = tmp_path / "hot_cache.json"
+
+        with patch("data.cache.os.path.join", return_value=str(cache_file_path)):
+            cache("hot_cache", lambda: {"v": 1})
+            cache_file_path.unlink()
+            with patch("builtins.open", side_effect=AssertionError("disk read")):
+                result = cache("hot_cache", lambda: {"v": 2})
+
+        assert result == {"v": 1}
+
+    def test_should_write_through_to_disk(self, tmp_path):
+        cache_file_path = tmp_path / "write_through.json"
+
+        with patch("data.cache.os.path.join", return_value=str(cache_file_path)):
+            cache("write_through", lambda: {"v": 1})
+
+        clear_memory_cache()
+        with patch("data.cache.os.path.join", return_value=str(cache_file_path)):
+            result = cache("write_through", lambda: {"v": 2})
+
+        assert result == {"v": 1}
+
+    def test_should_respect_ttl_of_entries_in_memory(self, tmp_path):
+        cache_file_path = tmp_path / "short_lived.json"
+
+        with patch("data.cache.os.path.join", return_value=str(cache_file_path)):
+            cache("short_lived", lambda: 1, ttl=timedelta(seconds=-1))
+            result = cache("short_lived", lambda: 2, ttl=timedelta(minutes=1))
+
+        assert result == 2
+
+    def test_should_drop_least_recently_used_entries(self, tmp_path):
+        with patch.object(data.cache, "MEMORY_ENTRIES", 2):
+            for key in ["a", "b", "a", "c"]:
+                path = str(tmp_path / f"{key}.json")
+                with patch("data.cache.os.path.join", return_value=path):
+                    cache(key, lambda key=key: key)
+
+            assert list(data.cache._memory)[-2:] == [
+                str(tmp_path / "a.json"),
+                str(tmp_path / "c.json"),
+            ]
+            assert str(tmp_path / "b.json") not in data.cache._memory
+
+
+class TestConcurrentRefresh:
+    def test_should_write_through_a_temporary_file(self, tmp_path):
+        cache_file_path = tmp_path / "atomic.json"
+        cache_file_path.write_text(
+            json.dumps({"__cache__": 1, "created": 0, "ttl": 1, "data": "old"})
+        )
+        replaced = []
+        original_replace = os.replace
+
+        def recording_replace(src, dst):
+            replaced.append((src, dst))
+            assert json.loads(cache_file_path.read_text())["data"] == "old"
+            original_replace(src, dst)
+
+        with (
+            patch("data.cache.os.path.join", return_value=str(cache_file_path)),
+            patch("data.cache.os.replace", side_effect=recording_replace),
+        ):
+            cache("atomic", lambda: "new")
+
+        assert replaced[0][1] == str(cache_file_path)
+        assert json.loads(cache_file_path.read_text())["data"] == "new"
+        assert [p.name for p in tmp_path.iterdir() if p.suffix == ".tmp"] == []
+
+    def test_should_call_operation_once_for_concurrent_misses(self, tmp_path):
+        cache_file_path = tmp_path / "single_flight.json"
+        calls = []
+        results = []
+
+        def slow_operation():
+            calls.append(1)
+            time.sleep(0.1)
+            return {"v": len(calls)}
+
+        def read():
+            results.append(cache("single_flight", slow_operation))
+
+        with patch("data.cache.os.path.join", return_value=str(cache_file_path)):
+            threads = [threading.Thread(target=read) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert len(calls) == 1
+        assert results == [{"v": 1}] * 5
+
+    def test_should_wait_for_another_process_holding_the_lock(self, tmp_path):
+        cache_file_path = tmp_path / "other_process.json"
+        results = []
+
+        # Locks of separately opened files conflict like locks of two processes
+        with (
+            open(str(cache_file_path) + ".lock", "a") as lock_file,
+            patch("data.cache.os.path.join", return_value=str(cache_file_path)),
+        ):
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            reader = threading.Thread(
+                target=lambda: results.append(
+                    cache("other_process", lambda: "from reader")
+                )
+            )
+            reader.start()
+            time.sleep(0.1)
+            assert results == []
+
+            cache_file_path.write_text(
+                json.dumps(
+                    {"__cache__": 1, "created": time.time(), "ttl": 60, "data": "x"}
+                )
+            )
+            lock_file.close()
+            reader.join(2)
+
+        assert results == ["x"]
@@ -0,0 +1,61 @@
+import threading
+import time
+
+from data.collector import Source, collect
+
+
+class WhenCollectingFromSources:
+    def it_returns_results_keyed_by_source_name(self):
+        result = collect([Source("a", lambda: 1), Source("b", lambda: "two")])
+
+        assert result == {"a": 1, "b": "two"}
+
+    def it_runs_sources_concurrently(self):
+        barrier = threading.Barrier(3, timeout=2)
+
+        def waits_for_others():
+            barrier.wait()
+            return True
+
+        result = collect([Source(name, waits_for_others) for name in "abc"])
+
+        assert result == {"a": True, "b": True, "c": True}
+
+    def it_reports_none_for_a_failing_source(self):
+        def fails():
+            raise RuntimeError("upstream down")
+
+        result = collect([Source("ok", lambda: 1), Source("broken", fails)])
+
+        assert result == {"ok": 1, "broken": None}
+
+    def it_gives_up_on_a_source_after_its_own_deadline(self):
+        release = threading.Event()
+
+        def slow():
+            release.wait(2)
+            return "late"
+
+        started = time.monotonic()
+        result = collect(
+            [Source("slow", slow, deadline=0.1), Source("fast", lambda: "on time")]
+        )
+        release.set()
+
+        assert result == {"slow": None, "fast": "on time"}
+        assert time.monotonic() - started < 1
+
+    def it_returns_partial_results_when_cycle_budget_runs_out(self):
+        release = threading.Event()
+
+        def slow():
+            release.wait(2)
+            return "late"
+
+        result = collect(
+            [Source("slow", slow, deadline=10), Source("fast", lambda: 1)],
+            budget=0.1,
+        )
+        release.set()
+
+        assert result == {"slow": None, "fast": 1}
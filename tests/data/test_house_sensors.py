@@ -14,7 +14,7 @@ class WhenFetchingHouseTemperatures:
                 {"name": "sensor-other", "temperature": 19.0},
             ]
         }
-        with patch("data.house_sensors.requests.get", return_value=mock_response):
+        with patch("data.house_sensors.http_client.get", return_value=mock_response):
             result = get_house_temperatures()
 
         assert result == [
@@ -32,7 +32,7 @@ class WhenFetchingHouseTemperatures:
                 {"name": "sensor-master-bedroom", "temperature": 20.1},
             ]
         }
-        with patch("data.house_sensors.requests.get", return_value=mock_response):
+        with patch("data.house_sensors.http_client.get", return_value=mock_response):
             result = get_house_temperatures()
 
         assert [r["label"] for r in result] == ["Salon", "Sypialnia", "Kuchnia"]
@@ -45,7 +45,7 @@ class WhenFetchingHouseTemperatures:
                 {"name": "sensor-kitchen", "temperature": 22.8},
             ]
         }
-        with patch("data.house_sensors.requests.get", return_value=mock_response):
+        with patch("data.house_sensors.http_client.get", return_value=mock_response):
             result = get_house_temperatures()
 
         assert result == [
@@ -58,13 +58,13 @@ class WhenFetchingHouseTemperatures:
         mock_response.json.return_value = {
             "readings": [{"name": "sensor-other", "temperature": 18.0}]
         }
-        with patch("data.house_sensors.requests.get", return_value=mock_response):
+        with patch("data.house_sensors.http_client.get", return_value=mock_response):
             result = get_house_temperatures()
 
         assert result is None
 
     def it_returns_none_when_the_request_fails(self):
-        with patch("data.house_sensors.requests.get", side_effect=Exception("timeout")):
+        with patch("data.house_sensors.http_client.get", side_effect=Exception("timeout")):
             result = get_house_temperatures()
 
         assert result is None
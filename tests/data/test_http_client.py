@@ -0,0 +1,103 @@
+from unittest.mock import Mock, patch
+
+import pytest
+import requests
+
+from data import http_client
+from data.cache import NotModified
+
+
+@pytest.fixture(autouse=True)
+def fresh_session():
+    http_client.close()
+    yield
+    http_client.close()
+
+
+class WhenSharingTheHttpSession:
+    def it_reuses_one_session_across_calls(self):
+        assert http_client.session() is http_client.session()
+
+    def it_pools_connections_and_retries_per_host(self):
+        adapter = http_client.session().get_adapter("https://api.tibber.com")
+        assert adapter.max_retries is http_client.RETRY
+        assert adapter._pool_maxsize == http_client.POOL_SIZE
+
+    def it_sends_the_common_headers(self):
+        headers = http_client.session().headers
+        assert headers["User-Agent"] == http_client.USER_AGENT
+
+    def it_applies_the_default_timeout(self):
+        with patch.object(http_client.session(), "get") as mock_get:
+            http_client.get("https://example.com")
+            http_client.get("https://example.com", timeout=5)
+
+        assert mock_get.call_args_list[0].kwargs["timeout"] == (2, 4)
+        assert mock_get.call_args_list[1].kwargs["timeout"] == 5
+
+    def it_fits_a_retried_request_in_the_source_deadline(self):
+        attempts = http_client.RETRY.total + 1
+        assert attempts * sum(http_client.DEFAULT_TIMEOUT) <= 12
+        assert http_client.RETRY.backoff_factor == 0
+
+    def it_leaves_rate_limits_to_the_backoff(self):
+        assert 429 not in http_client.RETRY.status_forcelist
+        assert not http_client.RETRY.respect_retry_after_header
+
+    def it_starts_a_new_session_after_closing(self):
+        first = http_client.session()
+        http_client.close()
+        assert http_client.session() is not first
+
+
+def _response(status_code, body=None, headers=None):
+    response = Mock(status_code=status_code, headers=headers or {})
+    response.json.return_value = body
+    return response
+
+
+class WhenRevalidatingJsonResponses:
+    URL = "https://example.com/readings"
+
+    def it_returns_the_body_with_its_validators(self):
+        response = _response(200, {"a": 1}, {"ETag": '"v1"', "Last-Modified": "Mon"})
+        with patch.object(http_client, "get", return_value=response) as mock_get:
+            body, validators = http_client.get_json(self.URL)
+
+        assert body == {"a": 1}
+        assert validators == {"etag": '"v1"', "last_modified": "Mon"}
+        assert mock_get.call_args.kwargs["headers"] == {}
+
+    def it_sends_the_validators_of_the_last_response(self):
+        validators = {"etag": '"v1"', "last_modified": "Mon"}
+        response = _response(200, {"a": 2}, {"ETag": '"v2"'})
+        with patch.object(http_client, "get", return_value=response) as mock_get:
+            http_client.get_json(self.URL, validators)
+
+        assert mock_get.call_args.kwargs["headers"] == {
+            "If-None-Match": '"v1"',
+            "If-Modified-Since": "Mon",
+        }
+
+    def it_raises_not_modified_without_parsing_the_body(self):
+        not_modified = _response(304)
+        with (
+            patch.object(http_client, "get", return_value=not_modified),
+            pytest.raises(NotModified),
+        ):
+            http_client.get_json(self.URL, {"etag": '"v1"', "last_modified": None})
+
+        not_modified.json.assert_not_called()
+
+    def it_returns_no_validators_when_the_response_has_none(self):
+        with patch.object(http_client, "get", return_value=_response(200, {"a": 1})):
+            assert http_client.get_json(self.URL) == ({"a": 1}, None)
+
+    def it_raises_on_error_statuses(self):
+        failed = _response(503)
+        failed.raise_for_status.side_effect = requests.HTTPError("503")
+        with (
+            patch.object(http_client, "get", return_value=failed),
+            pytest.raises(requests.HTTPError),
+        ):
+            http_client.get_json(self.URL)
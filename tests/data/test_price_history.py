@@ -0,0 +1,130 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from data import price_history
+from data.price_history import PriceHistory, percentile_rank, record
+
+DAY = date(2025, 12, 11)
+
+
+def _flat(price):
+    return [price] * 96
+
+
+class WhenRecordingPrices:
+    def it_appends_one_row_per_day(self, tmp_path):
+        path = str(tmp_path / "prices.f64")
+        record(DAY, _flat(1.0), path)
+        record(DAY + timedelta(days=1), _flat(2.0), path)
+
+        history = PriceHistory.open(path)
+        assert len(history) == 2
+        assert history.first_day == DAY
+        assert history.day(DAY + timedelta(days=1))[0] == 2.0
+
+    def it_fills_missed_days_with_nan(self, tmp_path):
+        path = str(tmp_path / "prices.f64")
+        record(DAY, _flat(1.0), path)
+        record(DAY + timedelta(days=3), _flat(2.0), path)
+
+        history = PriceHistory.open(path)
+        assert len(history) == 4
+        assert np.isnan(history.day(DAY + timedelta(days=1))).all()
+
+    def it_overwrites_a_day_recorded_again(self, tmp_path):
+        path = str(tmp_path / "prices.f64")
+        record(DAY, _flat(1.0), path)
+        record(DAY + timedelta(days=1), _flat(2.0), path)
+        record(DAY, _flat(3.0), path)
+
+        history = PriceHistory.open(path)
+        assert len(history) == 2
+        assert history.day(DAY)[0] == 3.0
+
+    def it_aligns_daylight_saving_days_to_the_wall_clock(self, tmp_path):
+        path = str(tmp_path / "prices.f64")
+        record(DAY, list(range(92)), path)
+        record(DAY + timedelta(days=1), list(range(100)), path)
+
+        history = PriceHistory.open(path)
+        spring = history.day(DAY)
+        assert np.isnan(spring[8:12]).all()
+        assert spring[12] == 8
+        autumn = history.day(DAY + timedelta(days=1))
+        assert autumn[12] == 16
+        assert autumn[-1] == 99
+
+    def it_spreads_hourly_prices_over_quarters(self, tmp_path):
+        path = str(tmp_path / "prices.f64")
+        record(DAY, list(range(24)), path)
+
+        assert list(PriceHistory.open(path).day(DAY)[4:8]) == [1.0] * 4
+
+    def it_rejects_a_partial_day(self, tmp_path):
+        with pytest.raises(ValueError, match="Expected a day of prices"):
+            record(DAY, [1.0, 2.0], str(tmp_path / "prices.f64"))
+
+    def it_writes_to_the_history_dir_by_default(self):
+        record(DAY, _flat(1.0))
+        assert len(PriceHistory.open()) == 1
+
+
+class WhenQueryingHistory:
+    @pytest.fixture
+    def history(self, tmp_path):
+        path = str(tmp_path / "prices.f64")
+        for offset in range(28):
+            record(DAY + timedelta(days=offset), _flat(float(offset)), path)
+        return PriceHistory.open(path)
+
+    def it_is_empty_without_a_file(self, tmp_path):
+        history = PriceHistory.open(str(tmp_path / "missing.f64"))
+        assert len(history) == 0
+        assert np.isnan(history.window(DAY, 3)).all()
+
+    def it_pads_windows_reaching_before_the_first_day(self, history):
+        window = history.window(DAY + timedelta(days=1), 3)
+        assert np.isnan(window[0]).all()
+        assert window[1][0] == 0.0
+        assert window[2][0] == 1.0
+
+    def it_averages_over_a_rolling_window(self, history):
+        averages = history.rolling_average(DAY + timedelta(days=27), 3, window=7)
+        assert list(averages) == [22.0, 23.0, 24.0]
+
+    def it_skips_unknown_days_in_rolling_averages(self, history):
+        averages = history.rolling_average(DAY + timedelta(days=1), 2, window=3)
+        assert list(averages) == [0.0, 0.5]
+
+    def it_computes_percentiles_of_recorded_prices(self, history):
+        result = history.percentiles(DAY + timedelta(days=27), 30, [0, 50, 100])
+        assert list(result) == [0.0, 13.5, 27.0]
+
+    def it_picks_the_same_weekday_of_previous_weeks(self, history):
+        rows = history.same_weekday(DAY + timedelta(days=21), weeks=4)
+        assert [row[0] for row in rows[:3]] == [14.0, 7.0, 0.0]
+        assert np.isnan(rows[3]).all()
+
+
+class WhenSummarisingTheLastMonth:
+    def it_needs_a_week_of_history(self):
+        for offset in range(6):
+            record(DAY + timedelta(days=offset), _flat(1.0))
+        assert price_history.price_distribution(DAY + timedelta(days=5)) == {}
+
+    def it_returns_deciles_of_the_recorded_days(self):
+        for offset in range(10):
+            record(DAY + timedelta(days=offset), _flat(float(offset)))
+
+        distribution = price_history.price_distribution(DAY + timedelta(days=9))
+
+        assert distribution["days"] == 10
+        assert distribution["deciles"][0] == 0.0
+        assert distribution["deciles"][10] == 9.0
+
+    def it_ranks_a_price_within_the_deciles(self):
+        deciles = [float(d) for d in range(11)]
+        assert percentile_rank(4.5, deciles) == 45.0
+        assert percentile_rank(20.0, deciles) == 100.0
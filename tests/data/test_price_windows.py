@@ -0,0 +1,64 @@
+import random
+import time
+
+import pytest
+
+from data.price_windows import (
+    PriceWindow,
+    cheapest_quarters,
+    cheapest_window,
+    cheapest_windows,
+)
+
+PRICES = [0.9, 0.8, 0.2, 0.3, 0.1, 0.7, 0.4, 0.05]
+
+
+class WhenFindingTheCheapestWindow:
+    def it_finds_the_cheapest_contiguous_run(self):
+        assert cheapest_window(PRICES, 45) == PriceWindow(2, 5, pytest.approx(0.2))
+
+    def it_rounds_durations_up_to_whole_quarters(self):
+        assert cheapest_window(PRICES, 20) == cheapest_window(PRICES, 30)
+
+    def it_ignores_quarters_before_the_start(self):
+        window = cheapest_window(PRICES, 30, start=5)
+        assert (window.start, window.end) == (6, 8)
+
+    def it_returns_none_when_the_window_does_not_fit(self):
+        assert cheapest_window(PRICES, 150) is None
+        assert cheapest_window(PRICES, 30, start=7) is None
+
+    def it_searches_several_durations_in_one_pass(self):
+        windows = cheapest_windows(PRICES, [15, 60, 600])
+        assert windows[15] == PriceWindow(7, 8, pytest.approx(0.05))
+        assert (windows[60].start, windows[60].end) == (4, 8)
+        assert windows[600] is None
+
+    def it_spans_today_and_tomorrow(self):
+        today = [1.0] * 96
+        tomorrow = [0.5] * 4 + [1.0] * 92
+        window = cheapest_window(today + tomorrow, 60, start=90)
+        assert (window.start, window.end) == (96, 100)
+
+
+class WhenPickingTheCheapestQuarters:
+    def it_returns_them_in_time_order(self):
+        assert cheapest_quarters(PRICES, 3) == [2, 4, 7]
+
+    def it_ignores_quarters_before_the_start(self):
+        assert cheapest_quarters(PRICES, 2, start=5) == [6, 7]
+
+    def it_returns_everything_left_when_asked_for_more(self):
+        assert cheapest_quarters(PRICES, 10, start=6) == [6, 7]
+
+    def it_returns_nothing_for_no_quarters(self):
+        assert cheapest_quarters(PRICES, 0) == []
+
+
+def test_searches_two_days_for_several_durations_quickly():
+    prices = [random.uniform(-0.2, 3.0) for _ in range(192)]
+    started = time.perf_counter()
+    for _ in range(100):
+        cheapest_windows(prices, [30, 60, 120, 180, 240], start=40)
+        cheapest_quarters(prices, 16, start=40)
+    assert time.perf_counter() - started < 1.0
@@ -1,8 +1,12 @@
 import pytest
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 from unittest.mock import patch, Mock
 import requests
+from data.cache import _cache_file, _lookup
+from concurrent.futures import ThreadPoolExecutor
 from data.public_transport import get_morning_departures, get_morning_departures_cached, _fetch_departures
+from data.public_transport import StopRule, compile_rule, compile_stops
 
 
 @pytest.mark.parametrize(
@@ -16,7 +20,7 @@ def test_returns_no_departures_outside_morning_hours(hour_outside_morning_commut
     assert departures == []
 
 
-@patch("data.public_transport.requests.get")
+@patch("data.public_transport.http_client.get")
 def test_fetches_departures_during_morning_hours(mock_get):
     mock_response = Mock()
     mock_response.json.return_value = {
@@ -45,13 +49,14 @@ def test_fetches_departures_during_morning_hours(mock_get):
             "journey_state": "EXPECTED",
             "walk_time_minutes": 6,
             "is_missed": False,
+            "site_id": 2216,
         }
     ]
 
     assert departures == expected
 
 
-@patch("data.public_transport.requests.get")
+@patch("data.public_transport.http_client.get")
 def test_filters_only_bus_605_to_danderyds_sjukhus(mock_get):
     mock_response = Mock()
     mock_response.json.return_value = {
@@ -94,13 +99,14 @@ def test_filters_only_bus_605_to_danderyds_sjukhus(mock_get):
             "journey_state": "EXPECTED",
             "walk_time_minutes": 6,
             "is_missed": False,
+            "site_id": 2216,
         }
     ]
 
     assert departures == expected
 
 
-@patch("data.public_transport.requests.get")
+@patch("data.public_transport.http_client.get")
 def test_returns_departures_from_both_stops(mock_get):
     def mock_api_response(url, **kwargs):
         response = Mock()
@@ -145,6 +151,7 @@ def test_returns_departures_from_both_stops(mock_get):
             "journey_state": "NORMALPROGRESS",
             "walk_time_minutes": 10,
             "is_missed": False,
+            "site_id": 9633,
         },
         {
             "stop_name": "Lahällsviadukten",
@@ -155,13 +162,14 @@ def test_returns_departures_from_both_stops(mock_get):
             "journey_state": "EXPECTED",
             "walk_time_minutes": 6,
             "is_missed": False,
+            "site_id": 2216,
         },
     ]
 
     assert departures == expected
 
 
-@patch("data.public_transport.requests.get")
+@patch("data.public_transport.http_client.get")
 def test_marks_departures_as_missed_when_scheduled_within_walk_time(mock_get):
     mock_response = Mock()
     mock_response.json.return_value = {
@@ -197,6 +205,7 @@ def test_marks_departures_as_missed_when_scheduled_within_walk_time(mock_get):
             "journey_state": "EXPECTED",
             "walk_time_minutes": 6,
             "is_missed": True,
+            "site_id": 2216,
         },
         {
             "stop_name": "Lahällsviadukten",
@@ -207,13 +216,14 @@ def test_marks_departures_as_missed_when_scheduled_within_walk_time(mock_get):
             "journey_state": "EXPECTED",
             "walk_time_minutes": 6,
             "is_missed": False,
+            "site_id": 2216,
         },
     ]
 
     assert departures == expected
 
 
-@patch("data.public_transport.requests.get")
+@patch("data.public_transport.http_client.get")
 def test_filters_departures_beyond_30_minutes(mock_get):
     mock_response = Mock()
     mock_response.json.return_value = {
@@ -251,7 +261,7 @@ def test_filters_departures_beyond_30_minutes(mock_get):
     assert departures[1]["scheduled_time"] == datetime(2025, 11, 8, 8, 25, 0)
 
 
-@patch("data.public_transport.requests.get")
+@patch("data.public_transport.http_client.get")
 def test_always_returns_at_least_one_departure_even_beyond_30_minutes(mock_get):
     mock_response = Mock()
     mock_response.json.return_value = {
@@ -281,57 +291,321 @@ def test_always_returns_at_least_one_departure_even_beyond_30_minutes(mock_get):
     assert departures[0]["scheduled_time"] == datetime(2025, 11, 8, 8, 45, 0)
 
 
-@patch("data.public_transport.cache")
-@patch("data.public_transport.get_morning_departures")
-def test_caches_with_10_minute_intervals(mock_get_departures, mock_cache):
-    mock_cache.return_value = []
+def _departure(scheduled, walk_time_minutes=6):
+    return {
+        "stop_name": "Lahällsviadukten",
+        "destination": "Danderyds sjukhus",
+        "line_number": "605",
+        "scheduled_time": scheduled,
+        "transport_mode": "BUS",
+        "journey_state": "EXPECTED",
+        "walk_time_minutes": walk_time_minutes,
+        "is_missed": False,
+    }
+
 
-    now = datetime(2025, 11, 8, 8, 17, 30)
-    get_morning_departures_cached(now=now)
+@patch("data.public_transport._matching_departures")
+def test_cache_expires_when_the_first_departure_leaves(mock_matching):
+    mock_matching.return_value = [
+        _departure(datetime(2025, 11, 8, 8, 20, 0)),
+        _departure(datetime(2025, 11, 8, 8, 35, 0)),
+    ]
 
-    mock_cache.assert_called_once()
-    cache_key = mock_cache.call_args[0][0]
-    assert cache_key == "sl-departures-20251108-0810"
+    with patch("data.public_transport.cache") as mock_cache:
+        mock_cache.return_value = []
+        get_morning_departures_cached(now=datetime(2025, 11, 8, 8, 17, 30))
 
+    assert mock_cache.call_args[0][0] == "sl-departures"
+    ttl = mock_cache.call_args[1]["ttl"]
+    assert ttl(mock_matching.return_value) == timedelta(minutes=2, seconds=30)
 
-@patch("data.public_transport.cache")
-@patch("data.public_transport.get_morning_departures")
-def test_cache_key_rounds_to_10_minute_intervals(mock_get_departures, mock_cache):
-    mock_cache.return_value = []
 
-    test_times = [
-        (datetime(2025, 11, 8, 8, 0, 0), "sl-departures-20251108-0800"),
-        (datetime(2025, 11, 8, 8, 9, 59), "sl-departures-20251108-0800"),
-        (datetime(2025, 11, 8, 8, 10, 0), "sl-departures-20251108-0810"),
-        (datetime(2025, 11, 8, 8, 19, 30), "sl-departures-20251108-0810"),
-        (datetime(2025, 11, 8, 8, 20, 0), "sl-departures-20251108-0820"),
-    ]
+@pytest.mark.parametrize(
+    "now, expected_ttl",
+    [
+        (datetime(2025, 11, 8, 8, 0, 0), timedelta(minutes=10)),
+        (datetime(2025, 11, 8, 10, 55, 0), timedelta(minutes=10)),
+        (datetime(2025, 11, 8, 6, 30, 0), timedelta(minutes=30)),
+        (datetime(2025, 11, 8, 23, 55, 0), timedelta(hours=7, minutes=5)),
+    ],
+)
+def test_caches_no_departures_until_the_next_plausible_one(now, expected_ttl):
+    with patch("data.public_transport.http_client.get") as mock_get:
+        mock_get.return_value.json.return_value = {"departures": []}
+        assert get_morning_departures_cached(now=now) == []
+        requests_made = mock_get.call_count
+        assert get_morning_departures_cached(now=now) == []
+
+    assert mock_get.call_count == requests_made
+    entry = _lookup(_cache_file("sl-departures"), time.time())
+    assert entry["ttl"] == expected_ttl.total_seconds()
+
+
+@patch("data.public_transport.http_client.get")
+def test_flags_missed_departures_from_the_cache_as_time_passes(mock_get):
+    mock_get.return_value.json.return_value = {
+        "departures": [
+            {
+                "destination": "Danderyds sjukhus",
+                "scheduled": "2025-11-08T08:20:00",
+                "line": {"designation": "605", "transport_mode": "BUS"},
+                "journey": {"id": 123, "state": "EXPECTED"},
+                "stop_area": {"name": "Lahällsviadukten"},
+            }
+        ]
+    }
 
-    for now, expected_key in test_times:
-        mock_cache.reset_mock()
-        get_morning_departures_cached(now=now)
-        cache_key = mock_cache.call_args[0][0]
-        assert cache_key == expected_key
+    first = get_morning_departures_cached(now=datetime(2025, 11, 8, 8, 0, 0))
+    later = get_morning_departures_cached(now=datetime(2025, 11, 8, 8, 16, 0))
+    gone = get_morning_departures(now=datetime(2025, 11, 8, 8, 21, 0))
 
+    assert first[0]["is_missed"] is False
+    assert later[0]["is_missed"] is True
+    assert gone == []
+    # Both stops for the first read and for the uncached call, none for the
+    # cached read in between
+    assert mock_get.call_count == 4
 
-@patch("data.public_transport.requests.get")
+
+@patch("data.public_transport.http_client.get")
 def test_fetch_departures_handles_http_error(mock_get):
     mock_response = Mock()
     mock_response.raise_for_status.side_effect = requests.exceptions.HTTPError("HTTP Error")
     mock_get.return_value = mock_response
 
-    result = _fetch_departures(2216)
-
-    assert result == []
+    with pytest.raises(requests.exceptions.HTTPError):
+        _fetch_departures(2216)
 
 
-@patch("data.public_transport.requests.get")
+@patch("data.public_transport.http_client.get")
 def test_fetch_departures_handles_json_decode_error(mock_get):
     mock_response = Mock()
     mock_response.raise_for_status.return_value = None
     mock_response.json.side_effect = requests.exceptions.JSONDecodeError("Expecting value", "doc", 0)
     mock_get.return_value = mock_response
 
-    result = _fetch_departures(2216)
+    with pytest.raises(requests.exceptions.JSONDecodeError):
+        _fetch_departures(2216)
+
+
+@patch("data.public_transport.http_client.get")
+def test_asks_sl_to_filter_departures_by_mode_line_and_window(mock_get):
+    mock_get.return_value.json.return_value = {"departures": []}
+
+    get_morning_departures(now=datetime(2025, 11, 8, 8, 0, 0))
+
+    params_by_site = {
+        call.args[0].split("/")[-2]: call.kwargs["params"]
+        for call in mock_get.call_args_list
+    }
+    assert params_by_site["2216"] == {"transport": "BUS", "line": 605, "forecast": 60}
+    assert params_by_site["9633"] == {"transport": "TRAM", "forecast": 60}
+
+
+def _raw(mode, line, destination):
+    return {
+        "destination": destination,
+        "line": {"designation": line, "transport_mode": mode},
+    }
 
-    assert result == []
+
+class WhenCompilingTransportRules:
+    def it_checks_only_the_fields_a_rule_sets(self):
+        tram_to_town = compile_rule(
+            StopRule(1, 5, transport_mode="TRAM", destination_contains="östra")
+        )
+
+        assert tram_to_town(_raw("TRAM", "27", "Stockholms östra"))
+        assert tram_to_town(_raw("TRAM", "28", "Stockholms östra"))
+        assert not tram_to_town(_raw("BUS", "27", "Stockholms östra"))
+        assert not tram_to_town(_raw("TRAM", "27", "Kårsta"))
+
+    def it_groups_rules_by_stop_with_their_walk_times(self):
+        (stop,) = compile_stops(
+            [
+                {"site_id": 1, "walk_minutes": 5, "line": "605"},
+                {"site_id": 1, "walk_minutes": 8, "line": "606", "destination": "A"},
+            ]
+        )
+
+        assert stop.match(_raw("BUS", "605", "B")) == 5
+        assert stop.match(_raw("BUS", "606", "A")) == 8
+        assert stop.match(_raw("BUS", "606", "B")) is None
+
+    def it_sends_only_the_filters_all_rules_of_a_stop_share(self):
+        shared_mode, single_line = compile_stops(
+            [
+                StopRule(1, 5, transport_mode="BUS", line="605"),
+                StopRule(1, 5, transport_mode="BUS", line="606"),
+                StopRule(2, 5, transport_mode="TRAM", line=27),
+            ]
+        )
+
+        assert shared_mode.query == {"forecast": 60, "transport": "BUS"}
+        assert single_line.query == {"forecast": 60, "transport": "TRAM", "line": 27}
+
+
+@patch("data.public_transport.http_client.get")
+def test_fetches_every_configured_stop_in_a_bounded_pool(mock_get):
+    def departures_for(url, **kwargs):
+        site_id = url.split("/")[-2]
+        response = Mock()
+        response.json.return_value = {
+            "departures": [
+                {
+                    "destination": "Danderyds sjukhus",
+                    "scheduled": f"2025-11-08T08:{site_id}:00",
+                    "line": {"designation": "605", "transport_mode": "BUS"},
+                    "journey": {"id": 1, "state": "EXPECTED"},
+                    "stop_area": {"name": f"Stop {site_id}"},
+                }
+            ]
+        }
+        return response
+
+    mock_get.side_effect = departures_for
+    stops = compile_stops([StopRule(10 + i, i, line="605") for i in range(6)])
+
+    with (
+        patch("data.public_transport.STOPS", stops),
+        patch(
+            "data.public_transport.ThreadPoolExecutor", wraps=ThreadPoolExecutor
+        ) as pool,
+    ):
+        departures = get_morning_departures(now=datetime(2025, 11, 8, 8, 0, 0))
+
+    assert pool.call_args.kwargs["max_workers"] == 4
+    assert [d["stop_name"] for d in departures] == [f"Stop {s}" for s in range(10, 16)]
+    assert [d["walk_time_minutes"] for d in departures] == list(range(6))
+
+
+def _sl_response(status, scheduled=(), etag=None):
+    response = Mock(status_code=status, headers={"ETag": etag} if etag else {})
+    response.json.return_value = {
+        "departures": [
+            {
+                "destination": "Stockholms östra",
+                "scheduled": time,
+                "line": {"designation": "27", "transport_mode": "TRAM"},
+                "journey": {"id": 456, "state": "NORMALPROGRESS"},
+                "stop_area": {"name": "Roslags Näsby"},
+            }
+            for time in scheduled
+        ]
+    }
+    return response
+
+
+def test_revalidates_each_stop_with_its_own_validators():
+    bus = _sl_response(200, etag='"bus-1"')
+    bus.json.return_value = {
+        "departures": [
+            {
+                "destination": "Danderyds sjukhus",
+                "scheduled": "2025-11-08T08:17:36",
+                "line": {"designation": "605", "transport_mode": "BUS"},
+                "journey": {"id": 123, "state": "EXPECTED"},
+                "stop_area": {"name": "Lahällsviadukten"},
+            }
+        ]
+    }
+    responses = {
+        "2216": [bus, _sl_response(304)],
+        "9633": [
+            _sl_response(200, ["2025-11-08T08:15:00"], '"tram-1"'),
+            _sl_response(200, ["2025-11-08T08:45:00"], '"tram-2"'),
+        ],
+    }
+    headers = {"2216": [], "9633": []}
+
+    def respond(url, **kwargs):
+        site = url.split("/")[-2]
+        headers[site].append(kwargs["headers"])
+        return responses[site].pop(0)
+
+    with patch("data.public_transport.http_client.get", side_effect=respond):
+        get_morning_departures_cached(now=datetime(2025, 11, 8, 8, 0))
+        with patch("data.cache.time.time", return_value=time.time() + 3600):
+            departures = get_morning_departures_cached(
+                now=datetime(2025, 11, 8, 8, 16)
+            )
+
+    assert headers["2216"][1] == {"If-None-Match": '"bus-1"'}
+    assert headers["9633"][1] == {"If-None-Match": '"tram-1"'}
+    assert [(d["line_number"], d["scheduled_time"]) for d in departures] == [
+        ("605", datetime(2025, 11, 8, 8, 17, 36)),
+        ("27", datetime(2025, 11, 8, 8, 45)),
+    ]
+
+
+def test_keeps_the_departures_when_no_stop_changed():
+    first = _sl_response(200, ["2025-11-08T08:15:00", "2025-11-08T08:40:00"], '"v1"')
+    not_modified = _sl_response(304)
+
+    def respond(url, **kwargs):
+        return first if first.json.call_count == 0 else not_modified
+
+    with (
+        patch("data.public_transport.STOPS", compile_stops([StopRule(9633, 10)])),
+        patch("data.public_transport.http_client.get", side_effect=respond),
+    ):
+        get_morning_departures_cached(now=datetime(2025, 11, 8, 8, 0))
+        with patch("data.cache.time.time", return_value=time.time() + 3600):
+            departures = get_morning_departures_cached(
+                now=datetime(2025, 11, 8, 8, 20)
+            )
+
+    not_modified.json.assert_not_called()
+    assert [d["scheduled_time"] for d in departures] == [datetime(2025, 11, 8, 8, 40)]
+    entry = _lookup(_cache_file("sl-departures"), time.time() + 3600)
+    assert entry["validators"] == {"9633": {"etag": '"v1"', "last_modified": None}}
+
+
+def test_caches_nothing_when_no_stop_can_be_reached():
+    with (
+        patch(
+            "data.public_transport.http_client.get",
+            side_effect=requests.exceptions.ConnectionError("down"),
+        ),
+        pytest.raises(requests.exceptions.ConnectionError),
+    ):
+        get_morning_departures_cached(now=datetime(2025, 11, 8, 8, 0))
+
+    assert _lookup(_cache_file("sl-departures"), time.time()) is None
+
+
+def test_keeps_the_departures_of_a_stop_that_cannot_be_reached():
+    responses = {
+        "9633": [
+            _sl_response(200, ["2025-11-08T08:30:00"]),
+            requests.exceptions.ConnectionError("down"),
+        ],
+        "9634": [
+            _sl_response(200, ["2025-11-08T08:35:00"]),
+            _sl_response(200, ["2025-11-08T08:25:00"]),
+        ],
+    }
+
+    def respond(url, **kwargs):
+        response = responses[url.split("/")[-2]].pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    stops = compile_stops([StopRule(9633, 10), StopRule(9634, 10)])
+    with (
+        patch("data.public_transport.STOPS", stops),
+        patch("data.public_transport.http_client.get", side_effect=respond),
+    ):
+        get_morning_departures_cached(now=datetime(2025, 11, 8, 8, 0))
+        with patch("data.cache.time.time", return_value=time.time() + 3600):
+            departures = get_morning_departures_cached(
+                now=datetime(2025, 11, 8, 8, 10)
+            )
+
+    assert [(d["site_id"], d["scheduled_time"]) for d in departures] == [
+        (9634, datetime(2025, 11, 8, 8, 25)),
+        (9633, datetime(2025, 11, 8, 8, 30)),
+    ]
+    entry = _lookup(_cache_file("sl-departures"), time.time() + 3600)
+    assert entry["ttl"] == timedelta(minutes=2).total_seconds()
@@ -0,0 +1,179 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from unittest.mock import Mock, patch
+
+from data.collector import Source
+from data.scheduler import Scheduler, is_due
+
+
+class WhenDecidingIfSourceIsDue:
+    def it_is_due_when_never_fetched(self):
+        source = Source("prices", Mock(), refresh_every=timedelta(days=1))
+
+        assert is_due(source, None, datetime(2025, 12, 11, 10, 0))
+
+    def it_is_not_due_within_the_same_slot(self):
+        source = Source("stats", Mock(), refresh_every=timedelta(hours=1))
+
+        assert not is_due(
+            source, datetime(2025, 12, 11, 10, 5), datetime(2025, 12, 11, 10, 55)
+        )
+
+    def it_is_due_at_the_start_of_the_next_slot(self):
+        source = Source("stats", Mock(), refresh_every=timedelta(hours=1))
+
+        assert is_due(
+            source, datetime(2025, 12, 11, 10, 55), datetime(2025, 12, 11, 11, 0)
+        )
+
+    def it_treats_daily_sources_as_due_after_midnight(self):
+        source = Source("prices", Mock(), refresh_every=timedelta(days=1))
+
+        assert is_due(
+            source, datetime(2025, 12, 11, 23, 50), datetime(2025, 12, 12, 0, 5)
+        )
+
+    def it_is_always_due_without_refresh_interval(self):
+        source = Source("weather", Mock())
+
+        assert is_due(
+            source, datetime(2025, 12, 11, 10, 0), datetime(2025, 12, 11, 10, 0)
+        )
+
+
+class WhenRunningScheduledCycle:
+    def it_only_calls_sources_that_are_due(self, tmp_path):
+        state_file = str(tmp_path / "scheduler.json")
+        prices = Mock(return_value=[0.5, 0.6])
+        stats = Mock(side_effect=[{"cost": 1}, {"cost": 2}])
+        sources = [
+            Source("prices", prices, refresh_every=timedelta(days=1)),
+            Source("stats", stats, refresh_every=timedelta(hours=1)),
+        ]
+
+        Scheduler(state_file).run(sources, datetime(2025, 12, 11, 10, 0))
+        result = Scheduler(state_file).run(sources, datetime(2025, 12, 11, 11, 0))
+
+        assert prices.call_count == 1
+        assert stats.call_count == 2
+        assert result == {"prices": [0.5, 0.6], "stats": {"cost": 2}, "stale": []}
+
+    def it_retries_failed_sources_on_the_next_cycle(self, tmp_path):
+        source = Mock(side_effect=[None, {"temp": 21}])
+        sources = [Source("temps", source, refresh_every=timedelta(hours=1))]
+        scheduler = Scheduler(str(tmp_path / "scheduler.json"))
+
+        scheduler.run(sources, datetime(2025, 12, 11, 10, 0))
+        result = scheduler.run(sources, datetime(2025, 12, 11, 10, 1))
+
+        assert source.call_count == 2
+        assert result == {"temps": {"temp": 21}, "stale": []}
+
+    def it_keeps_datetimes_in_remembered_values(self, tmp_path):
+        state_file = str(tmp_path / "scheduler.json")
+        departure = datetime(2025, 12, 11, 8, 17)
+        sources = [
+            Source(
+                "transport",
+                lambda: [{"scheduled_time": departure}],
+                refresh_every=timedelta(hours=1),
+            )
+        ]
+
+        Scheduler(state_file).run(sources, datetime(2025, 12, 11, 8, 0))
+        result = Scheduler(state_file).run(sources, datetime(2025, 12, 11, 8, 1))
+
+        assert result["transport"] == [{"scheduled_time": departure}]
+
+
+class WhenSourceFails:
+    def it_serves_last_good_value_marked_as_stale(self, tmp_path):
+        source = Mock(side_effect=[{"temp": 21}, None])
+        sources = [Source("temps", source, refresh_every=timedelta(hours=1))]
+        scheduler = Scheduler(str(tmp_path / "scheduler.json"))
+
+        scheduler.run(sources, datetime(2025, 12, 11, 10, 0))
+        result = scheduler.run(sources, datetime(2025, 12, 11, 11, 0))
+
+        assert result == {"temps": {"temp": 21}, "stale": ["temps"]}
+
+    def it_does_not_wait_for_a_source_that_failed_last_time(self, tmp_path):
+        release = threading.Event()
+
+        def slow():
+            release.wait(2)
+            return {"temp": 23}
+
+        state_file = str(tmp_path / "scheduler.json")
+        failing = Mock(side_effect=[{"temp": 21}, None])
+        Scheduler(state_file).run(
+            [Source("temps", failing, refresh_every=timedelta(hours=1))],
+            datetime(2025, 12, 11, 10, 0),
+        )
+        Scheduler(state_file).run(
+            [Source("temps", failing, refresh_every=timedelta(hours=1))],
+            datetime(2025, 12, 11, 11, 0),
+        )
+
+        scheduler = Scheduler(state_file)
+        started = time.monotonic()
+        result = scheduler.run(
+            [Source("temps", slow, deadline=10, refresh_every=timedelta(hours=1))],
+            datetime(2025, 12, 11, 12, 0),
+        )
+        elapsed = time.monotonic() - started
+        release.set()
+
+        assert elapsed < 1
+        assert result == {"temps": {"temp": 21}, "stale": ["temps"]}
+
+    def it_stores_the_background_refresh_for_the_next_cycle(self, tmp_path):
+        state_file = str(tmp_path / "scheduler.json")
+        sources = [
+            Source(
+                "temps",
+                Mock(side_effect=[{"temp": 21}, None, {"temp": 23}]),
+                refresh_every=timedelta(hours=1),
+            )
+        ]
+        scheduler = Scheduler(state_file)
+        scheduler.run(sources, datetime(2025, 12, 11, 10, 0))
+        scheduler.run(sources, datetime(2025, 12, 11, 11, 0))
+
+        scheduler.run(sources, datetime(2025, 12, 11, 12, 0))
+        deadline = time.monotonic() + 2
+        while scheduler._last_good("temps") != {"temp": 23}:
+            assert time.monotonic() < deadline
+            time.sleep(0.01)
+
+        assert Scheduler(state_file).state["temps"]["value"] == {"temp": 23}
+
+
+class WhenSavingSchedulerState:
+    def it_saves_the_state_once_per_cycle(self, tmp_path):
+        sources = [
+            Source(name, Mock(return_value={"v": name}), refresh_every=None)
+            for name in ("prices", "stats", "temps")
+        ]
+        scheduler = Scheduler(str(tmp_path / "scheduler.json"))
+
+        with patch.object(
+            scheduler, "_save_state", wraps=scheduler._save_state
+        ) as save:
+            scheduler.run(sources, datetime(2025, 12, 11, 10, 0))
+
+        assert save.call_count == 1
+
+    def it_keeps_the_last_good_state_when_a_save_is_cut_short(self, tmp_path):
+        state_file = str(tmp_path / "scheduler.json")
+        sources = [Source("temps", Mock(return_value={"temp": 21}))]
+        Scheduler(state_file).run(sources, datetime(2025, 12, 11, 10, 0))
+
+        scheduler = Scheduler(state_file)
+        scheduler.state["temps"]["value"] = {"temp": 23}
+        with patch("data.cache.os.fsync", side_effect=OSError("power cut")):
+            scheduler._finish_collecting()
+
+        assert Scheduler(state_file).state["temps"]["value"] == {"temp": 21}
+        assert [path.name for path in tmp_path.iterdir()] == ["scheduler.json"]
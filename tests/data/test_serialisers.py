@@ -0,0 +1,120 @@
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+import pytest
+
+from data.cache import cache
+from data.serialisers import (
+    BinarySerialiser,
+    JsonSerialiser,
+    serialiser_for,
+)
+
+
+def _entry(data, ttl=3600.0):
+    return {"__cache__": 1, "created": 1765440000.5, "ttl": ttl, "data": data}
+
+
+class WhenSerialisingCacheEntries:
+    @pytest.mark.parametrize("serialiser", [JsonSerialiser(), BinarySerialiser()])
+    def it_round_trips_collected_data(self, serialiser):
+        entry = _entry(
+            {
+                "prices": [0.5 + i / 100 for i in range(96)],
+                "stats": {"production": 0, "profit": 1.25, "cost": None},
+                "departures": [
+                    {
+                        "stop_name": "Roslags Näsby",
+                        "scheduled_time": datetime(2025, 11, 8, 8, 17, 36),
+                        "is_missed": False,
+                    }
+                ],
+                "from": datetime(
+                    2025, 12, 11, 10, 0, tzinfo=timezone(timedelta(hours=1))
+                ),
+            }
+        )
+
+        assert serialiser.loads(serialiser.dumps(entry)) == entry
+
+    def it_keeps_entries_without_ttl(self):
+        serialiser = BinarySerialiser()
+        entry = _entry([1, 2, 3], ttl=None)
+
+        assert serialiser.loads(serialiser.dumps(entry)) == entry
+
+    @pytest.mark.parametrize("serialiser", [JsonSerialiser(), BinarySerialiser()])
+    def it_keeps_entries_that_already_expired(self, serialiser):
+        entry = _entry([1, 2, 3], ttl=-30.0)
+
+        assert serialiser.loads(serialiser.dumps(entry)) == entry
+
+    def it_reads_binary_entries_written_with_a_negative_missing_ttl(self):
+        serialiser = BinarySerialiser()
+        raw = bytearray(serialiser.dumps(_entry([1, 2, 3], ttl=-1.0)))
+        raw[len(serialiser.MAGIC)] = 2
+
+        assert serialiser.loads(bytes(raw))["ttl"] is None
+
+    @pytest.mark.parametrize("serialiser", [JsonSerialiser(), BinarySerialiser()])
+    def it_keeps_the_validators_of_an_entry(self, serialiser):
+        entry = _entry([1, 2, 3]) | {
+            "validators": {"etag": '"v1"', "last_modified": None}
+        }
+
+        assert serialiser.loads(serialiser.dumps(entry)) == entry
+
+    def it_reads_binary_entries_written_before_validators(self):
+        serialiser = BinarySerialiser()
+        raw = bytearray(serialiser.dumps(_entry([1, 2, 3])))
+        # Version 1 entries were the same without the trailing validators
+        raw[len(serialiser.MAGIC)] = 1
+
+        assert serialiser.loads(bytes(raw[:-1])) == _entry([1, 2, 3])
+
+    def it_packs_price_arrays_smaller_than_json(self):
+        entry = _entry([1.2345678 + i / 1000 for i in range(96)])
+
+        binary = BinarySerialiser().dumps(entry)
+        text = JsonSerialiser().dumps(entry)
+
+        assert len(binary) < len(text)
+
+    def it_recognises_the_format_of_stored_bytes(self):
+        entry = _entry([0.5])
+
+        assert serialiser_for(BinarySerialiser().dumps(entry)).name == "binary"
+        assert serialiser_for(JsonSerialiser().dumps(entry)).name == "json"
+
+    def it_rejects_values_that_cannot_be_cached(self):
+        with pytest.raises(TypeError):
+            BinarySerialiser().dumps(_entry({"value": object()}))
+
+
+class WhenSwitchingCacheFormat:
+    def it_writes_binary_entries_when_configured(self, tmp_path):
+        cache_file_path = tmp_path / "prices.bin"
+
+        with (
+            patch("data.cache.CACHE_FORMAT", "binary"),
+            patch("data.cache.os.path.join", return_value=str(cache_file_path)),
+        ):
+            cache("prices", lambda: [0.5, 0.6])
+
+        assert cache_file_path.read_bytes().startswith(BinarySerialiser.MAGIC)
+
+    def it_reads_entries_written_in_the_other_format(self, tmp_path):
+        json_file = tmp_path / "prices.json"
+        json_file.write_bytes(
+            JsonSerialiser().dumps(
+                {"__cache__": 1, "created": 0, "ttl": None, "data": [0.5, 0.6]}
+            )
+        )
+
+        with (
+            patch("data.cache.CACHE_FORMAT", "binary"),
+            patch("data.cache.os.path.join", return_value=str(tmp_path / "prices.bin")),
+        ):
+            result = cache("prices", lambda: [9.9])
+
+        assert result == [0.5, 0.6]
@@ -1,9 +1,15 @@
 import pytest
 from unittest.mock import AsyncMock, patch
 
+import data.thermia
 from data.thermia import get_outdoor_temp, _decode_signed_16bit
 
 
+@pytest.fixture(autouse=True)
+def disconnected(monkeypatch):
+    monkeypatch.setattr(data.thermia, "_connection", None)
+
+
 class WhenDecodingSignedTemperatureValues:
     def it_returns_positive_values_unchanged(self):
         assert _decode_signed_16bit(1080) == 1080
@@ -66,3 +72,34 @@ class WhenReadingOutdoorTemperature:
             result = get_outdoor_temp()
 
         assert result is None
+
+    def it_keeps_the_connection_between_reads(self):
+        mock_client = AsyncMock()
+        mock_client.read_input_registers = AsyncMock(return_value=[500])
+
+        with patch(
+            "data.thermia.tmodbus.create_async_tcp_client", return_value=mock_client
+        ) as create:
+            get_outdoor_temp()
+            get_outdoor_temp()
+
+        create.assert_called_once()
+        mock_client.__aexit__.assert_not_awaited()
+
+    def it_reconnects_after_a_failed_read(self):
+        broken = AsyncMock()
+        broken.read_input_registers = AsyncMock(side_effect=Exception("read timeout"))
+        working = AsyncMock()
+        working.read_input_registers = AsyncMock(return_value=[500])
+
+        with (
+            patch(
+                "data.thermia.tmodbus.create_async_tcp_client",
+                side_effect=[broken, working],
+            ),
+            patch("data.thermia.guarded", side_effect=lambda upstream, op: op()),
+        ):
+            assert get_outdoor_temp() is None
+            assert get_outdoor_temp() == pytest.approx(5.0)
+
+        broken.__aexit__.assert_awaited_once()
@@ -1,5 +1,11 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
 import pytest
 from unittest.mock import patch
+from data import cache
+from data.price_history import PriceHistory
 import data.tibber as tibber
 
 
@@ -102,10 +108,8 @@ def test_load_stats_raises_error_when_no_homes_in_response(mock_token):
 
 @patch("data.tibber.load_token", return_value="fake-token")
 def test_load_stats_handles_missing_production_data(mock_token):
-    import datetime
-    with patch("data.tibber.datetime") as mock_datetime:
-        mock_datetime.now.return_value.day = 11
-        mock_datetime.fromisoformat.side_effect = lambda x: datetime.datetime.fromisoformat(x)
+    with patch("data.tibber.datetime", wraps=datetime) as mock_datetime:
+        mock_datetime.now.return_value = datetime(2025, 12, 11, 12, 0)
         with patch("data.tibber.load_data_from_tibber") as mock_load:
             mock_load.return_value = {
                 "data": {
@@ -147,10 +151,8 @@ class WhenFetchingTibberData:
 
 @patch("data.tibber.load_token", return_value="fake-token")
 def test_load_stats_handles_missing_consumption_data(mock_token):
-    import datetime
-    with patch("data.tibber.datetime") as mock_datetime:
-        mock_datetime.now.return_value.day = 11
-        mock_datetime.fromisoformat.side_effect = lambda x: datetime.datetime.fromisoformat(x)
+    with patch("data.tibber.datetime", wraps=datetime) as mock_datetime:
+        mock_datetime.now.return_value = datetime(2025, 12, 11, 12, 0)
         with patch("data.tibber.load_data_from_tibber") as mock_load:
             mock_load.return_value = {
                 "data": {
@@ -178,3 +180,431 @@ def test_load_stats_handles_missing_consumption_data(mock_token):
             assert stats["profit"] == 3.5
             assert stats["consumption"] == 0
             assert stats["cost"] == 0
+
+
+def _prices_response(today, tomorrow):
+    return {
+        "data": {
+            "viewer": {
+                "homes": [
+                    {
+                        "currentSubscription": {
+                            "priceInfo": {"today": today, "tomorrow": tomorrow}
+                        }
+                    }
+                ]
+            }
+        }
+    }
+
+
+TODAY = [{"total": 0.5, "startsAt": "2025-12-11T00:00:00+01:00"}]
+TOMORROW = [
+    {"total": 0.8, "startsAt": "2025-12-12T00:00:00+01:00"},
+    {"total": 0.9, "startsAt": "2025-12-12T00:15:00+01:00"},
+]
+
+
+class WhenTomorrowsPricesArePublished:
+
+    @patch("data.tibber.load_token", return_value="fake-token")
+    def it_stores_them_under_the_next_days_key(self, mock_token):
+        with (
+            patch("data.tibber.load_data_from_tibber") as mock_load,
+            patch("data.tibber.datetime", wraps=datetime) as mock_datetime,
+        ):
+            mock_load.return_value = _prices_response(TODAY, TOMORROW)
+            mock_datetime.now.return_value = datetime(2025, 12, 11, 14, 0)
+            assert tibber.tibber_energy_prices() == [0.5]
+
+        assert cache.peek("tibber-prices-20251212") == [0.8, 0.9]
+
+    @patch("data.tibber.load_token", return_value="fake-token")
+    def it_stores_nothing_while_tomorrow_is_empty(self, mock_token):
+        with (
+            patch("data.tibber.load_data_from_tibber") as mock_load,
+            patch("data.tibber.datetime", wraps=datetime) as mock_datetime,
+        ):
+            mock_load.return_value = _prices_response(TODAY, [])
+            mock_datetime.now.return_value = datetime(2025, 12, 11, 14, 0)
+            assert tibber.tibber_energy_prices_tomorrow() == []
+            tibber.tibber_energy_prices()
+
+        assert cache.peek("tibber-prices-20251212") is None
+
+    @patch("data.tibber.load_token", return_value="fake-token")
+    def it_serves_the_prefetched_prices_at_midnight(self, mock_token):
+        with (
+            patch("data.tibber.load_data_from_tibber") as mock_load,
+            patch("data.tibber.datetime", wraps=datetime) as mock_datetime,
+        ):
+            mock_load.return_value = _prices_response(TODAY, TOMORROW)
+            mock_datetime.now.return_value = datetime(2025, 12, 11, 14, 0)
+            assert tibber.tibber_energy_prices_tomorrow() == [0.8, 0.9]
+            mock_datetime.now.return_value = datetime(2025, 12, 12, 0, 0, 5)
+            assert tibber.tibber_energy_prices() == [0.8, 0.9]
+
+        assert mock_load.call_count == 1
+
+    def it_does_not_ask_before_they_are_published(self):
+        with (
+            patch("data.tibber.load_data_from_tibber") as mock_load,
+            patch("data.tibber.datetime", wraps=datetime) as mock_datetime,
+        ):
+            mock_datetime.now.return_value = datetime(2025, 12, 11, 9, 0)
+            assert tibber.tibber_energy_prices_tomorrow() == []
+
+        mock_load.assert_not_called()
+
+    def it_returns_none_when_the_prefetch_fails(self):
+        with (
+            patch(
+                "data.tibber.load_data_from_tibber",
+                side_effect=RuntimeError("network error"),
+            ),
+            patch("data.tibber.datetime", wraps=datetime) as mock_datetime,
+        ):
+            mock_datetime.now.return_value = datetime(2025, 12, 11, 14, 0)
+            assert tibber.tibber_energy_prices_tomorrow() is None
+
+
+def _combined_response():
+    response = _prices_response(TODAY, [])
+    home = response["data"]["viewer"]["homes"][0]
+    home["consumption"] = {
+        "nodes": [
+            {
+                "from": "2025-12-11T08:00:00+01:00",
+                "to": "2025-12-11T09:00:00+01:00",
+                "cost": 1.5,
+                "consumption": 2.0,
+            }
+        ]
+    }
+    home["production"] = {"nodes": []}
+    return response
+
+
+class WhenPricesAndStatsAreBothDue:
+    @patch("data.tibber.load_token", return_value="fake-token")
+    def it_fetches_them_in_one_request(self, mock_token):
+        with (
+            patch("data.tibber.load_data_from_tibber") as mock_load,
+            patch("data.tibber.datetime", wraps=datetime) as mock_datetime,
+        ):
+            mock_load.return_value = _combined_response()
+            mock_datetime.now.return_value = datetime(2025, 12, 11, 9, 30)
+
+            assert tibber.tibber_energy_prices() == [0.5]
+            stats = tibber.tibber_energy_stats()
+
+        assert stats["consumption"] == 2.0
+        assert stats["cost"] == 1.5
+        mock_load.assert_called_once()
+        query = mock_load.call_args.args[1]
+        assert tibber.PRICES_SELECTION in query
+        assert "consumption(" in query
+
+    @patch("data.tibber.load_token", return_value="fake-token")
+    def it_polls_tomorrows_prices_in_the_same_request(self, mock_token):
+        response = _combined_response()
+        home = response["data"]["viewer"]["homes"][0]
+        home["currentSubscription"]["priceInfo"]["tomorrow"] = TOMORROW
+
+        def post(token, query):
+            time.sleep(0.05)
+            return response
+
+        sources = (
+            tibber.tibber_energy_prices,
+            tibber.tibber_energy_stats,
+            tibber.tibber_energy_prices_tomorrow,
+        )
+        with (
+            patch("data.tibber.load_data_from_tibber", side_effect=post) as mock_load,
+            patch("data.tibber.datetime", wraps=datetime) as mock_datetime,
+            ThreadPoolExecutor(max_workers=3) as executor,
+        ):
+            mock_datetime.now.return_value = datetime(2025, 12, 11, 14, 5)
+            futures = [executor.submit(source) for source in sources]
+            prices, stats, tomorrow = [future.result() for future in futures]
+
+        assert mock_load.call_count == 1
+        assert prices == [0.5]
+        assert stats["consumption"] == 2.0
+        assert tomorrow == [0.8, 0.9]
+
+    @patch("data.tibber.load_token", return_value="fake-token")
+    def it_only_asks_for_what_is_not_cached(self, mock_token):
+        with (
+            patch("data.tibber.load_data_from_tibber") as mock_load,
+            patch("data.tibber.datetime", wraps=datetime) as mock_datetime,
+        ):
+            mock_datetime.now.return_value = datetime(2025, 12, 11, 9, 30)
+            cache.store("tibber-prices-20251211", [0.5])
+            mock_load.return_value = _combined_response()
+
+            tibber.tibber_energy_stats()
+
+        query = mock_load.call_args.args[1]
+        assert tibber.PRICES_SELECTION not in query
+        assert "consumption(" in query
+
+    @patch("data.tibber.load_token", return_value="fake-token")
+    def it_still_returns_the_wanted_entry_when_the_other_cannot_be_read(
+        self, mock_token
+    ):
+        with (
+            patch("data.tibber.load_data_from_tibber") as mock_load,
+            patch("data.tibber.datetime", wraps=datetime) as mock_datetime,
+        ):
+            mock_load.return_value = _prices_response(TODAY, [])
+            mock_datetime.now.return_value = datetime(2025, 12, 11, 9, 30)
+
+            assert tibber.tibber_energy_prices() == [0.5]
+
+        assert cache.peek("tibber-stats") is None
+
+
+def test_build_query_merges_selections():
+    assert (
+        tibber.build_query("a { b }", "c")
+        == "{ viewer { homes { id appNickname a { b } c }}}"
+    )
+
+
+def _stats_response(consumption, production=()):
+    def nodes(values, amount, series):
+        return [
+            {"from": start, amount: money, series: value}
+            for start, value, money in values
+        ]
+
+    return {
+        "data": {
+            "viewer": {
+                "homes": [
+                    {
+                        "consumption": {
+                            "nodes": nodes(consumption, "cost", "consumption")
+                        },
+                        "production": {
+                            "nodes": nodes(production, "profit", "production")
+                        },
+                    }
+                ]
+            }
+        }
+    }
+
+
+class WhenAccumulatingTheDaysStats:
+    def _load(self, now, response):
+        with (
+            patch("data.tibber.load_token", return_value="fake-token"),
+            patch("data.tibber.load_data_from_tibber") as mock_load,
+            patch("data.tibber.datetime", wraps=datetime) as mock_datetime,
+        ):
+            mock_datetime.now.return_value = now
+            mock_load.return_value = response
+            stats = tibber.load_day_stats_from_tibber()
+        return stats, mock_load.call_args.args[1]
+
+    def it_asks_for_the_hours_since_midnight_on_a_new_day(self):
+        stats, query = self._load(
+            datetime(2025, 12, 11, 9, 30),
+            _stats_response(
+                [
+                    ("2025-12-10T23:00:00+01:00", 5.0, 5.0),
+                    ("2025-12-11T00:00:00+01:00", 1.0, 0.5),
+                ]
+            ),
+        )
+
+        assert "consumption(resolution: HOURLY, last: 10)" in query
+        assert stats["consumption"] == 1.0
+        assert stats["cost"] == 0.5
+
+    def it_only_adds_hours_it_has_not_seen(self):
+        self._load(
+            datetime(2025, 12, 11, 9, 30),
+            _stats_response([("2025-12-11T08:00:00+01:00", 1.0, 0.5)]),
+        )
+        stats, _ = self._load(
+            datetime(2025, 12, 11, 10, 30),
+            _stats_response(
+                [
+                    ("2025-12-11T08:00:00+01:00", 1.0, 0.5),
+                    ("2025-12-11T09:00:00+01:00", 2.0, 1.0),
+                ],
+                [("2025-12-11T09:00:00+01:00", 3.0, 1.5)],
+            ),
+        )
+
+        assert stats == {
+            "consumption": 3.0,
+            "cost": 1.5,
+            "production": 3.0,
+            "profit": 1.5,
+        }
+
+    def it_does_not_count_hours_of_a_response_it_failed_to_read(self):
+        self._load(
+            datetime(2025, 12, 11, 9, 30),
+            _stats_response([("2025-12-11T08:00:00+01:00", 1.0, 0.5)]),
+        )
+        broken = _stats_response(
+            [("2025-12-11T09:00:00+01:00", 2.0, 1.0), ("not a timestamp", 3.0, 1.5)]
+        )
+        with pytest.raises(ValueError):
+            self._load(datetime(2025, 12, 11, 10, 30), broken)
+
+        stats, _ = self._load(
+            datetime(2025, 12, 11, 10, 30),
+            _stats_response([("2025-12-11T09:00:00+01:00", 2.0, 1.0)]),
+        )
+
+        assert stats["consumption"] == 3.0
+        assert stats["cost"] == 1.5
+
+    def it_asks_again_for_hours_that_were_not_metered_yet(self):
+        self._load(
+            datetime(2025, 12, 11, 9, 30),
+            _stats_response(
+                [
+                    ("2025-12-11T07:00:00+01:00", 1.0, 0.5),
+                    ("2025-12-11T08:00:00+01:00", None, None),
+                ]
+            ),
+        )
+        stats, _ = self._load(
+            datetime(2025, 12, 11, 10, 30),
+            _stats_response(
+                [
+                    ("2025-12-11T08:00:00+01:00", 2.0, 1.0),
+                    ("2025-12-11T09:00:00+01:00", 1.0, 0.5),
+                ]
+            ),
+        )
+
+        assert stats["consumption"] == 4.0
+
+    def it_starts_over_on_the_next_day(self):
+        self._load(
+            datetime(2025, 12, 11, 23, 30),
+            _stats_response([("2025-12-11T22:00:00+01:00", 1.0, 0.5)]),
+        )
+        stats, query = self._load(
+            datetime(2025, 12, 12, 0, 30),
+            _stats_response([("2025-12-11T23:00:00+01:00", 2.0, 1.0)]),
+        )
+
+        assert "consumption(resolution: HOURLY, last: 1)" in query
+        assert stats["consumption"] == 0
+
+
+def test_hours_to_fetch_overlaps_the_last_seen_hour():
+    now = datetime(2025, 12, 11, 10, 5, tzinfo=timezone(timedelta(hours=1)))
+    assert tibber._hours_to_fetch("2025-12-11T08:00:00+01:00", now) == 2
+    assert tibber._hours_to_fetch("2025-12-11T09:00:00+01:00", now) == 1
+    assert tibber._hours_to_fetch(None, now) == 11
+
+
+@patch("data.tibber.load_token", return_value="fake-token")
+def test_load_prices_records_full_days_in_price_history(mock_token):
+    start = datetime(2025, 12, 11, tzinfo=timezone(timedelta(hours=1)))
+    today = [
+        {"total": 0.5, "startsAt": (start + timedelta(minutes=15 * q)).isoformat()}
+        for q in range(96)
+    ]
+    with patch("data.tibber.load_data_from_tibber") as mock_load:
+        mock_load.return_value = _prices_response(today, [])
+        tibber.load_prices_from_tibber()
+
+    history = PriceHistory.open()
+    assert history.first_day == start.date()
+    assert list(history.day(start.date())) == [0.5] * 96
+
+
+def _home(home_id, nickname, price, consumption):
+    return {
+        "id": home_id,
+        "appNickname": nickname,
+        "currentSubscription": {
+            "priceInfo": {
+                "today": [{"total": price, "startsAt": "2025-12-11T00:00:00+01:00"}],
+                "tomorrow": [],
+            }
+        },
+        "consumption": {
+            "nodes": [
+                {
+                    "from": "2025-12-11T08:00:00+01:00",
+                    "cost": 1.0,
+                    "consumption": consumption,
+                }
+            ]
+        },
+        "production": {"nodes": []},
+    }
+
+
+TWO_HOMES = {
+    "data": {
+        "viewer": {
+            "homes": [
+                _home("home-1", "Villa", 0.5, 2.0),
+                _home("home-2", "Stuga", 0.7, 3.0),
+            ]
+        }
+    }
+}
+
+
+class WhenTheAccountHasSeveralHomes:
+    @patch("data.tibber.load_token", return_value="fake-token")
+    def it_picks_a_home_by_nickname_or_id(self, mock_token):
+        with (
+            patch("data.tibber.load_data_from_tibber", return_value=TWO_HOMES),
+            patch("data.tibber.datetime", wraps=datetime) as mock_datetime,
+        ):
+            mock_datetime.now.return_value = datetime(2025, 12, 11, 9, 30)
+            assert tibber.load_prices_from_tibber("Stuga") == [0.7]
+            assert tibber.load_prices_from_tibber("home-1") == [0.5]
+            assert tibber.load_day_stats_from_tibber("Stuga")["consumption"] == 3.0
+
+    @patch("data.tibber.load_token", return_value="fake-token")
+    def it_defaults_to_the_first_home(self, mock_token):
+        with patch("data.tibber.load_data_from_tibber", return_value=TWO_HOMES):
+            assert tibber.load_prices_from_tibber() == [0.5]
+
+    @patch("data.tibber.load_token", return_value="fake-token")
+    def it_raises_for_an_unknown_home(self, mock_token):
+        with (
+            patch("data.tibber.load_data_from_tibber", return_value=TWO_HOMES),
+            pytest.raises(RuntimeError, match="Tibber home `Garage` not found"),
+        ):
+            tibber.load_prices_from_tibber("Garage")
+
+    @patch("data.tibber.load_token", return_value="fake-token")
+    def it_caches_every_configured_home_from_one_request(self, mock_token):
+        with (
+            patch("data.tibber.HOMES", (None, "Stuga")),
+            patch("data.tibber.load_data_from_tibber") as mock_load,
+            patch("data.tibber.datetime", wraps=datetime) as mock_datetime,
+        ):
+            mock_datetime.now.return_value = datetime(2025, 12, 11, 9, 30)
+            mock_load.return_value = TWO_HOMES
+
+            assert tibber.tibber_energy_prices() == [0.5]
+            assert tibber.tibber_energy_prices("Stuga") == [0.7]
+            assert tibber.tibber_energy_stats() == {
+                "consumption": 2.0,
+                "cost": 1.0,
+                "production": 0,
+                "profit": 0,
+            }
+            assert tibber.tibber_energy_stats("Stuga")["consumption"] == 3.0
+
+        mock_load.assert_called_once()
+        assert cache.peek("tibber-prices-Stuga-20251211") == [0.7]
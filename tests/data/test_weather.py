@@ -1,7 +1,9 @@
 import datetime
+import time
 from unittest.mock import Mock, patch, mock_open
 import pytest
 import data.weather as weather
+from data.cache import store
 
 
 @pytest.fixture
@@ -23,7 +25,11 @@ def mock_weather_response():
             }
         ]
     }
-    return [mock_current, mock_forecast]
+
+    def respond(url, **kwargs):
+        return mock_forecast if url.endswith("forecast") else mock_current
+
+    return respond
 
 
 def test_load_token_returns_file_content_when_file_exists():
@@ -46,7 +52,7 @@ def test_load_token_raises_error_when_file_not_found():
 
 def test_get_weather_returns_structured_data(mock_weather_response):
     with patch("data.weather.load_token", return_value="test_token"):
-        with patch("data.weather.requests.get", side_effect=mock_weather_response):
+        with patch("data.weather.http_client.get", side_effect=mock_weather_response):
             result = weather.get_weather()
 
     assert result["name"] == "Stockholm"
@@ -62,7 +68,7 @@ def test_get_weather_returns_structured_data(mock_weather_response):
 
 def test_get_weather_uses_correct_params():
     with patch("data.weather.load_token", return_value="test_token"):
-        with patch("data.weather.requests.get") as mock_get:
+        with patch("data.weather.http_client.get") as mock_get:
             mock_get.return_value.json.return_value = {
                 "name": "S",
                 "sys": {"sunrise": 0, "sunset": 0},
@@ -72,13 +78,92 @@ def test_get_weather_uses_correct_params():
             }
             weather.get_weather()
 
-            # Check first call (current weather)
-            args, kwargs = mock_get.call_args_list[0]
-            assert "weather" in args[0]
-            assert kwargs["params"]["appid"] == "test_token"
-            assert kwargs["params"]["units"] == "metric"
+            calls = {
+                args[0].rsplit("/", 1)[1]: kwargs
+                for args, kwargs in mock_get.call_args_list
+            }
+
+            # Current weather
+            assert calls["weather"]["params"]["appid"] == "test_token"
+            assert calls["weather"]["params"]["units"] == "metric"
+
+            # Forecast
+            assert calls["forecast"]["params"]["cnt"] == 8
+
+
+def test_get_weather_reuses_both_parts_while_they_are_fresh(mock_weather_response):
+    with (
+        patch("data.weather.load_token", return_value="test_token"),
+        patch("data.weather.datetime", wraps=datetime.datetime) as mock_datetime,
+        patch(
+            "data.weather.http_client.get", side_effect=mock_weather_response
+        ) as mock_get,
+    ):
+        mock_datetime.now.return_value = datetime.datetime.fromtimestamp(1600040000)
+        first = weather.get_weather()
+        second = weather.get_weather()
+
+    assert mock_get.call_count == 2
+    assert second == first
+
 
-            # Check second call (forecast)
-            args, kwargs = mock_get.call_args_list[1]
-            assert "forecast" in args[0]
-            assert kwargs["params"]["cnt"] == 8
+def test_get_weather_refetches_only_the_expired_part(mock_weather_response):
+    with (
+        patch("data.weather.load_token", return_value="test_token"),
+        patch("data.weather.datetime", wraps=datetime.datetime) as mock_datetime,
+        patch(
+            "data.weather.http_client.get", side_effect=mock_weather_response
+        ) as mock_get,
+    ):
+        mock_datetime.now.return_value = datetime.datetime.fromtimestamp(1600040000)
+        weather.get_weather()
+        store("openweather-current", {}, ttl=datetime.timedelta(seconds=-1))
+        weather.get_weather()
+
+    urls = [args[0] for args, _ in mock_get.call_args_list]
+    assert sum(url.endswith("forecast") for url in urls) == 1
+    assert sum(url.endswith("weather") for url in urls) == 2
+
+
+def test_forecast_is_kept_until_its_first_step_passes():
+    now = datetime.datetime(2025, 11, 8, 13, 20)
+    forecast = [
+        {"time": datetime.datetime(2025, 11, 8, 15, 0), "temp": 1, "icon": "i"}
+    ]
+    with patch("data.weather.datetime", wraps=datetime.datetime) as mock_datetime:
+        mock_datetime.now.return_value = now
+        ttl = weather._forecast_ttl(forecast)
+        assert ttl == datetime.timedelta(hours=1, minutes=40)
+        assert weather._forecast_ttl([]) == weather.FORECAST_STEP
+
+
+def test_get_weather_keeps_unchanged_parts_without_parsing(mock_weather_response):
+    def first_response(url, **kwargs):
+        response = mock_weather_response(url)
+        response.status_code = 200
+        response.headers = {"ETag": f'"{url.rsplit("/", 1)[1]}"'}
+        return response
+
+    not_modified = Mock(status_code=304)
+    with (
+        patch("data.weather.load_token", return_value="test_token"),
+        patch("data.weather.datetime", wraps=datetime.datetime) as mock_datetime,
+        patch("data.weather.http_client.get", side_effect=first_response),
+    ):
+        mock_datetime.now.return_value = datetime.datetime.fromtimestamp(1600040000)
+        first = weather.get_weather()
+        with (
+            patch("data.cache.time.time", return_value=time.time() + 4 * 3600),
+            patch(
+                "data.weather.http_client.get", return_value=not_modified
+            ) as mock_get,
+        ):
+            second = weather.get_weather()
+
+    assert second == first
+    sent = {
+        args[0].rsplit("/", 1)[1]: kwargs for args, kwargs in mock_get.call_args_list
+    }
+    assert sent["weather"]["headers"] == {"If-None-Match": '"weather"'}
+    assert sent["forecast"]["headers"] == {"If-None-Match": '"forecast"'}
+    not_modified.json.assert_not_called()
@@ -0,0 +1,56 @@
+import os
+import signal
+import threading
+import time
+
+from daemon import Daemon
+
+
+class WhenRunningAsDaemon:
+    def it_refreshes_until_stopped(self):
+        calls = []
+
+        def refresh():
+            calls.append(1)
+            if len(calls) == 3:
+                daemon.stop()
+
+        daemon = Daemon(refresh, interval_seconds=0)
+        daemon.run()
+
+        assert len(calls) == 3
+
+    def it_keeps_running_when_a_cycle_fails(self):
+        calls = []
+
+        def refresh():
+            calls.append(1)
+            if len(calls) == 2:
+                daemon.stop()
+            raise RuntimeError("upstream down")
+
+        daemon = Daemon(refresh, interval_seconds=0)
+        daemon.run()
+
+        assert len(calls) == 2
+
+    def it_stops_on_sigterm(self):
+        def refresh():
+            # Signal once the daemon is waiting for the next cycle
+            threading.Timer(0.1, os.kill, (os.getpid(), signal.SIGTERM)).start()
+
+        daemon = Daemon(refresh, interval_seconds=3600)
+        handlers = {sig: signal.getsignal(sig) for sig in (signal.SIGTERM, signal.SIGINT)}
+        # Stops a daemon that ignored the signal, so the test fails instead of hanging
+        watchdog = threading.Timer(5, daemon.stop)
+        daemon.install_signal_handlers()
+        watchdog.start()
+        started = time.monotonic()
+        try:
+            daemon.run()
+        finally:
+            watchdog.cancel()
+            for sig, handler in handlers.items():
+                signal.signal(sig, handler)
+
+        assert time.monotonic() - started < 5
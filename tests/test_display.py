@@ -0,0 +1,59 @@
+from datetime import datetime
+from unittest.mock import patch
+
+import pytest
+from PIL import Image, ImageFont
+
+import display_backend
+import metrics
+from display import display
+from display_backend import PngFileBackend
+
+
+class DefaultFonts:
+    """Font loader that draws every text with PIL's built-in font."""
+
+    def __getattr__(self, name):
+        return lambda *args: ImageFont.load_default()
+
+
+def _data(current_time, consumption=15.3):
+    return {
+        "current_time": current_time,
+        "energy_prices": [1.0 + (quarter % 8) / 10 for quarter in range(96)],
+        "energy_stats": {
+            "production": 0.0,
+            "consumption": consumption,
+            "profit": 0.0,
+            "cost": 45.67,
+        },
+        "weather": None,
+        "house_temps": [{"label": "Salon", "temp": 22.1}],
+    }
+
+
+@pytest.fixture
+def backend(tmp_path):
+    with (
+        patch.object(display_backend, "Image", Image),
+        patch("locale.setlocale"),
+    ):
+        yield PngFileBackend(str(tmp_path / "frame.png"))
+
+
+def _pushed(backend, data):
+    before = metrics.FRAMES.value(result="pushed")
+    display(data, backend=backend, font_loader=DefaultFonts())
+    return metrics.FRAMES.value(result="pushed") > before
+
+
+class WhenDisplayingUnchangedData:
+    def it_skips_the_refresh_when_only_the_update_time_changed(self, backend):
+        assert _pushed(backend, _data(datetime(2025, 11, 8, 10, 30, 0)))
+        assert not _pushed(backend, _data(datetime(2025, 11, 8, 10, 31, 7)))
+
+    def it_refreshes_when_the_data_changed(self, backend):
+        assert _pushed(backend, _data(datetime(2025, 11, 8, 10, 30, 0)))
+        assert _pushed(
+            backend, _data(datetime(2025, 11, 8, 10, 31, 7), consumption=16.1)
+        )
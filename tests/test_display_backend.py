@@ -7,7 +7,12 @@ mock_inky = MagicMock()
 sys.modules["inky"] = mock_inky
 sys.modules["inky.auto"] = mock_inky.auto
 
-from display_backend import PngFileBackend, InkyBackend, create_backend  # noqa: E402
+from display_backend import (  # noqa: E402
+    FrameFingerprint,
+    InkyBackend,
+    PngFileBackend,
+    create_backend,
+)
 import display_backend  # noqa: E402
 
 # Mock PIL.Image only within display_backend
@@ -28,13 +33,36 @@ class TestPngFileBackend:
         backend.create_image()
         mock_pil.Image.new.assert_called_with("P", size=(400, 300), color=(255, 255, 255))
 
-    def test_show(self):
-        output_path = "test.png"
+    def test_show(self, tmp_path):
+        output_path = str(tmp_path / "test.png")
         backend = PngFileBackend(output_path=output_path)
         img = MagicMock()
+        img.tobytes.return_value = b"frame"
         backend.show(img)
         img.save.assert_called_once_with(output_path, format="PNG")
 
+    def test_show_skips_writing_unchanged_frame(self, tmp_path):
+        output_file = tmp_path / "test.png"
+        backend = PngFileBackend(output_path=str(output_file))
+        img = MagicMock()
+        img.tobytes.return_value = b"frame"
+        img.save.side_effect = lambda path, format: output_file.write_bytes(b"png")
+
+        assert backend.show(img) is True
+        assert backend.show(img) is False
+        img.save.assert_called_once()
+
+    def test_show_rewrites_frame_when_file_was_removed(self, tmp_path):
+        output_file = tmp_path / "test.png"
+        backend = PngFileBackend(output_path=str(output_file))
+        img = MagicMock()
+        img.tobytes.return_value = b"frame"
+
+        backend.show(img)
+        backend.show(img)
+
+        assert img.save.call_count == 2
+
 
 class TestInkyBackend:
     @patch("display_backend.InkyBackend.__init__", return_value=None)
@@ -59,18 +87,51 @@ class TestInkyBackend:
         mock_pil.Image.new.assert_called_with("P", (400, 300))
 
     @patch("display_backend.InkyBackend.__init__", return_value=None)
-    def test_show(self, mock_init):
+    def test_show(self, mock_init, tmp_path):
         backend = InkyBackend()
         backend.inky_display = MagicMock()
         backend.inky_display.WHITE = 2
+        backend.fingerprint = FrameFingerprint(str(tmp_path / "frame.sha256"))
 
         img = MagicMock()
+        img.tobytes.return_value = b"frame"
         backend.show(img)
 
         backend.inky_display.set_border.assert_called_once_with(2)
         backend.inky_display.set_image.assert_called_once_with(img)
         backend.inky_display.show.assert_called_once()
 
+    @patch("display_backend.InkyBackend.__init__", return_value=None)
+    def test_show_skips_refresh_for_unchanged_frame(self, mock_init, tmp_path):
+        fingerprint_path = str(tmp_path / "frame.sha256")
+        img = MagicMock()
+        img.tobytes.return_value = b"frame"
+
+        first_run = InkyBackend()
+        first_run.inky_display = MagicMock()
+        first_run.fingerprint = FrameFingerprint(fingerprint_path)
+        assert first_run.show(img) is True
+
+        second_run = InkyBackend()
+        second_run.inky_display = MagicMock()
+        second_run.fingerprint = FrameFingerprint(fingerprint_path)
+        assert second_run.show(img) is False
+        second_run.inky_display.show.assert_not_called()
+
+    @patch("display_backend.InkyBackend.__init__", return_value=None)
+    def test_show_refreshes_when_frame_changed(self, mock_init, tmp_path):
+        backend = InkyBackend()
+        backend.inky_display = MagicMock()
+        backend.fingerprint = FrameFingerprint(str(tmp_path / "frame.sha256"))
+        first, second = MagicMock(), MagicMock()
+        first.tobytes.return_value = b"frame"
+        second.tobytes.return_value = b"other frame"
+
+        backend.show(first)
+        backend.show(second)
+
+        assert backend.inky_display.show.call_count == 2
+
     def test_init_import_error(self):
         with patch("builtins.__import__", side_effect=ImportError):
             with pytest.raises(RuntimeError, match="inky library not available"):
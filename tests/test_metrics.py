@@ -0,0 +1,72 @@
+import urllib.error
+import urllib.request
+
+import pytest
+
+import metrics
+from data.collector import Source, collect
+
+
+class WhenExposingMetrics:
+    def it_renders_counters_with_labels(self):
+        counter = metrics.Counter("inky_test_total", "Test counter")
+
+        counter.inc(result="hit")
+        counter.inc(result="hit")
+        counter.inc(result="miss")
+
+        assert counter.exposition() == [
+            "# HELP inky_test_total Test counter",
+            "# TYPE inky_test_total counter",
+            'inky_test_total{result="hit"} 2',
+            'inky_test_total{result="miss"} 1',
+        ]
+
+    def it_renders_cumulative_histogram_buckets(self):
+        histogram = metrics.Histogram("inky_test_seconds", "Test", buckets=(1, 5))
+
+        histogram.observe(0.5, source="weather")
+        histogram.observe(3, source="weather")
+
+        lines = histogram.exposition()
+        assert 'inky_test_seconds_bucket{source="weather",le="1"} 1' in lines
+        assert 'inky_test_seconds_bucket{source="weather",le="5"} 2' in lines
+        assert 'inky_test_seconds_bucket{source="weather",le="+Inf"} 2' in lines
+        assert 'inky_test_seconds_sum{source="weather"} 3.5' in lines
+        assert 'inky_test_seconds_count{source="weather"} 2' in lines
+
+    def it_counts_fetch_latency_and_errors_per_source(self):
+        fetches = metrics.FETCH_SECONDS.count(source="metrics-test")
+        errors = metrics.FETCH_ERRORS.value(source="metrics-test")
+
+        collect([Source("metrics-test", lambda: None)])
+
+        assert metrics.FETCH_SECONDS.count(source="metrics-test") == fetches + 1
+        assert metrics.FETCH_ERRORS.value(source="metrics-test") == errors + 1
+
+
+class WhenServingMetrics:
+    @pytest.fixture
+    def server(self):
+        server = metrics.start_server("127.0.0.1", 0)
+        yield server
+        server.shutdown()
+        server.server_close()
+
+    def it_serves_prometheus_text_on_metrics_path(self, server):
+        metrics.FRAMES.inc(result="skipped")
+        url = f"http://127.0.0.1:{server.server_port}/metrics"
+
+        with urllib.request.urlopen(url, timeout=2) as response:
+            body = response.read().decode("utf-8")
+
+        assert response.headers["Content-Type"].startswith("text/plain")
+        assert 'inky_frames_total{result="skipped"}' in body
+
+    def it_returns_not_found_for_other_paths(self, server):
+        url = f"http://127.0.0.1:{server.server_port}/"
+
+        with pytest.raises(urllib.error.HTTPError) as error:
+            urllib.request.urlopen(url, timeout=2)
+
+        assert error.value.code == 404
@@ -0,0 +1,24 @@
+from datetime import datetime
+
+from snapshot import load_snapshot, save_snapshot
+
+
+class WhenRecordingSnapshot:
+    def it_restores_collected_data_including_datetimes(self, tmp_path):
+        path = str(tmp_path / "snapshots" / "winter.json")
+        data = {
+            "current_time": datetime(2024, 1, 15, 10, 30),
+            "energy_prices": [0.95, 0.93, 0.9],
+            "transport": [
+                {
+                    "stop_name": "Roslags Näsby",
+                    "scheduled_time": datetime(2024, 1, 15, 10, 42),
+                }
+            ],
+            "house_temps": None,
+            "stale": ["weather"],
+        }
+
+        save_snapshot(data, path)
+
+        assert load_snapshot(path) == data
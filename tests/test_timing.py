@@ -0,0 +1,46 @@
+import json
+
+import timing
+
+
+class WhenTimingRefreshCycle:
+    def it_records_wall_and_cpu_time_per_stage(self, tmp_path):
+        timing.start_cycle()
+
+        with timing.stage("render.HeaderWidget"):
+            sum(range(1000))
+
+        record = timing.finish_cycle(path=str(tmp_path / "timings.jsonl"))
+        stages = record["stages"]
+        assert stages["render.HeaderWidget"]["count"] == 1
+        assert stages["render.HeaderWidget"]["wall_ms"] >= 0
+        assert stages["render.HeaderWidget"]["cpu_ms"] >= 0
+
+    def it_accumulates_repeated_stages(self, tmp_path):
+        timing.start_cycle()
+
+        for _ in range(3):
+            with timing.stage("render.StaleMarkerWidget"):
+                pass
+
+        record = timing.finish_cycle(path=str(tmp_path / "timings.jsonl"))
+        assert record["stages"]["render.StaleMarkerWidget"]["count"] == 3
+
+    def it_writes_one_json_line_per_cycle(self, tmp_path):
+        path = tmp_path / "timings.jsonl"
+
+        for _ in range(2):
+            timing.start_cycle()
+            with timing.stage("fetch.weather"):
+                pass
+            timing.finish_cycle(path=str(path))
+
+        lines = path.read_text().splitlines()
+        assert len(lines) == 2
+        assert "fetch.weather" in json.loads(lines[0])["stages"]
+
+    def it_ignores_stages_outside_of_a_cycle(self, tmp_path):
+        with timing.stage("fetch.weather"):
+            pass
+
+        assert timing.finish_cycle(path=str(tmp_path / "timings.jsonl")) is None
@@ -0,0 +1,34 @@
+from unittest.mock import MagicMock, patch
+
+import update_display
+from display_backend import FrameFingerprint
+from snapshot import save_snapshot
+
+
+class WhenReplayingASnapshot:
+    def it_outputs_every_repeat_even_when_the_frame_is_unchanged(self, tmp_path):
+        snapshot = str(tmp_path / "snapshot.json")
+        output = tmp_path / "frame.png"
+        save_snapshot({"energy_prices": [0.5]}, snapshot)
+
+        image = MagicMock()
+        image.tobytes.return_value = b"frame"
+        image.save.side_effect = lambda path, format: output.write_bytes(b"png")
+        # As left behind by an earlier run of the same frame
+        output.write_bytes(b"png")
+        FrameFingerprint(str(output) + ".sha256").save(FrameFingerprint.of(image))
+
+        def render(data, backend, font_loader):
+            backend.show(image)
+
+        with (
+            patch("update_display.display", side_effect=render),
+            patch("update_display.FontLoader"),
+            patch("update_display.evict_if_due"),
+            patch("update_display.timing.finish_cycle"),
+        ):
+            update_display.replay(
+                snapshot, repeat=3, prefer_inky=False, output_path=str(output)
+            )
+
+        assert image.save.call_count == 3
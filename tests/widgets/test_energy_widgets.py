@@ -79,6 +79,29 @@ class TestEnergyPriceLabelsWidget:
         assert current_call[1]["fill"] == colours[0]
 
 
+    def test_energy_price_labels_widget_compares_current_price_with_history(self):
+        bounds = Rectangle(10, 28, 260, 30)
+        price_data = EnergyPriceData(
+            day_prices=[0.85, 0.92, 1.15, 1.22, 1.18, 0.95],
+            current_quarter=2,
+            history_range=(0.42, 1.1),
+            now_percentile=91.6,
+        )
+        widget = EnergyPriceLabelsWidget(bounds, MagicMock(), price_data)
+
+        mock_draw = MagicMock()
+        colours = PngFileBackend().colors
+
+        widget.render(mock_draw, colours)
+
+        assert mock_draw.text.call_count == 4
+        range_call, percentile_call = mock_draw.text.call_args_list[2:]
+        assert range_call[0] == ((260, 0), "30 d: 0.42 -- 1.1 SEK")
+        assert range_call[1]["anchor"] == "ra"
+        assert percentile_call[0] == ((260, 14), "now at p92")
+        assert percentile_call[1]["anchor"] == "ra"
+
+
 class TestEnergyPriceGraphWidget:
     def test_energy_price_graph_widget_renders_bars_and_highlights_current_hour(self):
         bounds = Rectangle(6, 60, 264, 224)
@@ -99,3 +122,38 @@ class TestEnergyPriceGraphWidget:
         first_rect_call = mock_draw.rectangle.call_args_list[0]
         assert first_rect_call[0][0] == [0, 0, 264, 224]
         assert first_rect_call[1]["outline"] == colours[0]
+
+    def test_energy_price_graph_widget_marks_the_cheapest_window(self):
+        bounds = Rectangle(6, 60, 264, 224)
+        price_data = EnergyPriceData(
+            day_prices=[0.5, 0.8, 0.2, 0.1, 0.6],
+            current_quarter=0,
+            cheapest_window=(2, 4),
+        )
+        widget = EnergyPriceGraphWidget(bounds, price_data)
+
+        mock_draw = MagicMock()
+        colours = PngFileBackend().colors
+
+        widget.render(mock_draw, colours)
+
+        overlay_call = mock_draw.rectangle.call_args_list[-1]
+        assert overlay_call[0][0] == [5, 2, 9, 3]
+        assert overlay_call[1]["fill"] == colours[1]
+
+    def test_energy_price_graph_widget_skips_a_window_starting_tomorrow(self):
+        bounds = Rectangle(6, 60, 264, 224)
+        price_data = EnergyPriceData(
+            day_prices=[0.5, 0.8, 0.2],
+            current_quarter=0,
+            cheapest_window=(5, 8),
+        )
+        widget = EnergyPriceGraphWidget(bounds, price_data)
+
+        mock_draw = MagicMock()
+        colours = PngFileBackend().colors
+
+        widget.render(mock_draw, colours)
+
+        # Frame, current quarter highlight and three bars
+        assert mock_draw.rectangle.call_count == 5
@@ -2,7 +2,7 @@ import datetime
 from unittest.mock import MagicMock
 
 from display_backend import PngFileBackend
-from widgets import FooterWidget, HeaderWidget, Rectangle
+from widgets import FooterWidget, HeaderWidget, Rectangle, StaleMarkerWidget
 
 
 class TestHeaderWidget:
@@ -48,3 +48,16 @@ class TestFooterWidget:
         assert call_args[0][0] == (50, 1)
         assert call_args[0][1] == "Updated: Mon 25 Dec 2023 14:30:45 "
         assert call_args[1]["fill"] == colours[1]
+
+
+class TestStaleMarkerWidget:
+    def test_stale_marker_renders_in_top_right_corner(self):
+        widget = StaleMarkerWidget(Rectangle(285, 208, 120, 79))
+        mock_draw = MagicMock()
+        colours = PngFileBackend().colors
+
+        widget.render(mock_draw, colours)
+
+        mock_draw.rectangle.assert_called_once_with(
+            [113, 0, 119, 6], fill=colours[1], outline=colours[0]
+        )